@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+AUDIO_MEMORY_LIMIT = int(os.getenv("AUDIO_MEMORY_LIMIT_MB", 32)) * 1024 * 1024
+# Source codecs Whisper accepts as-is, with the container to copy them into.
+COPYABLE_AUDIO = {"mp3": ("mp3", ".mp3"), "opus": ("ogg", ".ogg"), "vorbis": ("ogg", ".ogg")}
+MAX_COPY_BITRATE = 128000
+READ_SIZE = 256 * 1024
+
+
+class ExtractedAudio:
+    # Holds extracted audio in memory, spilling to a temp file past
+    # AUDIO_MEMORY_LIMIT. Use as an (async) context manager: every temp file
+    # it created is removed on exit, even if transcription raised.
+    def __init__(self, ext, path=None):
+        self.ext = ext
+        self.size = 0
+        self.elapsed = 0.0
+        self.copied = False
+        self._sha = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._path = path
+        self._owned = []
+        if path:
+            self.size = os.path.getsize(path)
+
+    @classmethod
+    def from_file(cls, path):
+        audio = cls(os.path.splitext(path)[1], path=path)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_SIZE), b""):
+                audio._sha.update(chunk)
+        return audio
+
+    def write(self, chunk):
+        self._sha.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self._buffer.tell() + len(chunk) > AUDIO_MEMORY_LIMIT:
+            fd, self._path = tempfile.mkstemp(suffix=self.ext)
+            self._owned.append(self._path)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._buffer.getvalue())
+            self._buffer = io.BytesIO()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def close_writer(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def sha256(self):
+        return self._sha.hexdigest()
+
+    @property
+    def in_memory(self):
+        return self._path is None
+
+    @property
+    def filename(self):
+        return f"audio{self.ext}"
+
+    def getvalue(self):
+        if self._path:
+            with open(self._path, "rb") as f:
+                return f.read()
+        return self._buffer.getvalue()
+
+    def as_upload(self):
+        # What the transcriber backends accept: a path, or (filename, bytes).
+        if self._path:
+            return self._path
+        return (self.filename, self._buffer.getvalue())
+
+    @property
+    def path(self):
+        # Only the chunked (long audio) path needs a real file for ffmpeg.
+        if self._path is None:
+            fd, self._path = tempfile.mkstemp(suffix=self.ext)
+            self._owned.append(self._path)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._buffer.getvalue())
+            self._buffer = io.BytesIO()
+        return self._path
+
+    def save(self, dest):
+        tmp = f"{dest}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.getvalue())
+        os.replace(tmp, dest)
+
+    def stats(self):
+        return {"audio_extract_seconds": round(self.elapsed, 3), "audio_bytes": self.size, "audio_stream_copied": self.copied}
+
+    def cleanup(self):
+        self.close_writer()
+        for p in self._owned:
+            if os.path.exists(p):
+                os.remove(p)
+        self._owned = []
+        self._buffer = io.BytesIO()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.cleanup()
+
+
+# The transcript cache is keyed on the extracted bytes, so the same input
+# must always extract identically: no random Ogg stream serial, no
+# encoder/version tags.
+BITEXACT_ARGS = ["-fflags", "+bitexact", "-map_metadata", "-1"]
+
+
+def extraction_cmd(input_p, info):
+    codec = info.get("audio_codec")
+    bitrate = info.get("audio_bitrate")
+    if codec in COPYABLE_AUDIO and (not bitrate or bitrate <= MAX_COPY_BITRATE):
+        fmt, ext = COPYABLE_AUDIO[codec]
+        return [
+            "ffmpeg", "-v", "error", "-i", input_p, "-vn", "-map", "0:a:0", "-c:a", "copy",
+            *BITEXACT_ARGS, "-f", fmt, "pipe:1"
+        ], ext, True
+
+    # 16 kHz mono Opus: a fraction of the MP3 size and cheaper to encode.
+    return [
+        "ffmpeg", "-v", "error", "-i", input_p, "-vn", "-map", "0:a:0",
+        "-ar", "16000", "-ac", "1", "-c:a", "libopus", "-b:a", "24k",
+        *BITEXACT_ARGS, "-f", "ogg", "pipe:1"
+    ], ".ogg", False
+
+
+async def extract_audio(input_p, info):
+    cmd, ext, copied = extraction_cmd(input_p, info)
+    audio = ExtractedAudio(ext)
+    audio.copied = copied
+    t0 = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stderr_task = asyncio.create_task(proc.stderr.read())
+        while True:
+            chunk = await proc.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            audio.write(chunk)
+        stderr = await stderr_task
+        await proc.wait()
+        audio.close_writer()
+        if proc.returncode != 0:
+            raise Exception(f"ffmpeg failed: {stderr.decode('utf-8', errors='replace')}")
+        if audio.size == 0:
+            raise Exception("No audio stream found in video")
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        audio.cleanup()
+        raise
+    audio.elapsed = time.perf_counter() - t0
+    return audio
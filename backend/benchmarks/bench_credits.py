@@ -0,0 +1,56 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from credits import CreditLedger, InsufficientCreditsError
+from benchmarks.fakes import FakeSupabase
+
+USER = "user-1"
+
+
+def export_flow(ledger, fail):
+    # What /api/export plus its job do with credits: one reserve, then one
+    # commit or refund.
+    try:
+        reservation_id = ledger.reserve(USER, 1)
+    except InsufficientCreditsError:
+        return "rejected"
+    if fail:
+        ledger.refund(USER, reservation_id)
+        return "refunded"
+    ledger.commit(USER, reservation_id)
+    return "committed"
+
+
+def main(args):
+    db = FakeSupabase({USER: args.credits}, latency=args.latency)
+    ledger = CreditLedger(db)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(lambda i: export_flow(ledger, i % args.fail_every == 0), range(1, args.exports + 1)))
+    elapsed = time.perf_counter() - t0
+
+    committed = outcomes.count("committed")
+    balance = db._profile(USER)["credits_remaining"]
+    print(f"{args.exports} concurrent exports against {args.credits} credits in {elapsed:.2f}s")
+    print(f"committed={committed} refunded={outcomes.count('refunded')} rejected={outcomes.count('rejected')}")
+    print(f"round trips: {db.calls} ({db.calls / args.exports:.1f} per export)")
+    ok = balance == args.credits - committed and balance >= 0
+    print(f"final balance {balance}: {'consistent' if ok else 'INCONSISTENT'}")
+
+    db.calls = 0
+    for _ in range(args.reads):
+        ledger.balance(USER)
+    print(f"{args.reads} balance reads within the TTL: {db.calls} round trips {ledger.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Credit ledger round trips and balance consistency under concurrent exports")
+    parser.add_argument("--exports", type=int, default=200)
+    parser.add_argument("--credits", type=int, default=150)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--fail-every", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--reads", type=int, default=100)
+    main(parser.parse_args())
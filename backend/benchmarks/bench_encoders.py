@@ -0,0 +1,39 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from encoders import ENCODERS, SLOT_THREADS
+from profiles import EXPORT_PROFILES, plan_render
+from benchmarks.media import make_test_video
+
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_encoders_")
+    fps = 30
+    src = make_test_video(os.path.join(work_dir, "src.mp4"), args.duration, args.width, args.height, fps=fps)
+    frames = args.duration * fps
+    tiers = args.tiers.split(",") if args.tiers else list(EXPORT_PROFILES)
+
+    print(f"{'encoder':<12} {'tier':<6} {'threads':>7} {'fps':>8} {'size MB':>8}")
+    for name, encoder in ENCODERS.items():
+        for tier in tiers:
+            plan = plan_render(args.width, args.height, tier)
+            out = os.path.join(work_dir, f"{name}_{tier}.mp4")
+            vf = [] if (plan["width"], plan["height"]) == (args.width, args.height) else ["-vf", f"scale={plan['width']}:{plan['height']}:flags={plan['scaler']}"]
+            cmd = ["ffmpeg", "-y", "-v", "error", "-i", src, *vf, *encoder.video_args(plan, args.threads), "-an", out]
+            t0 = time.perf_counter()
+            subprocess.run(cmd, check=True)
+            elapsed = time.perf_counter() - t0
+            print(f"{name:<12} {tier:<6} {args.threads:>7} {frames / elapsed:>8.1f} {os.path.getsize(out) / 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode fps and output size per encoder backend and quality tier")
+    parser.add_argument("--duration", type=int, default=20)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--threads", type=int, default=SLOT_THREADS)
+    parser.add_argument("--tiers", default="", help="comma-separated subset of quality tiers")
+    main(parser.parse_args())
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from processor import VideoProcessor
+from segmented import SegmentedBurner
+from benchmarks.media import make_test_video, make_captions, video_timing, png_has_alpha
+
+STYLE = {"font_family": "Arial", "font_size": 24, "text_color": "#FFFFFF", "position_y": 15}
+
+
+async def timed_burn(processor, src, out, captions, style, quality):
+    t0 = time.perf_counter()
+    result = await processor.burn_only(src, out, captions, style, quality=quality)
+    assert result["success"], result
+    return time.perf_counter() - t0
+
+
+async def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_overlay_")
+    processor = VideoProcessor("flat_fonts", os.path.join(work_dir, "cache"))
+    # Keep both modes on the single-pass path so only caption rendering differs.
+    processor.segmented = SegmentedBurner(processor, workers=1)
+    src = make_test_video(os.path.join(work_dir, "src.mp4"), args.duration, args.width, args.height)
+    captions = make_captions(args.duration, every=args.every)
+
+    out = os.path.join(work_dir, "ass.mp4")
+    ass_s = await timed_burn(processor, src, out, captions, STYLE, args.quality)
+    reference = video_timing(out)
+    print(f"ass:           {ass_s:.1f}s  {len(captions)} captions  {reference}")
+
+    style = {**STYLE, "render_mode": "overlay"}
+    for run in ("cold", "warm"):
+        out = os.path.join(work_dir, f"overlay_{run}.mp4")
+        elapsed = await timed_burn(processor, src, out, captions, style, args.quality)
+        timing = video_timing(out)
+        match = "timing matches" if timing == reference else f"TIMING MISMATCH {timing}"
+        print(f"overlay {run}:  {elapsed:.1f}s  ({ass_s / elapsed:.2f}x)  {match}  {processor.overlay.stats()}")
+
+    # Caption PNGs must actually carry the caption; blank_* are empty by design.
+    pngs = [p for _, _, p in processor.overlay.files() if not os.path.basename(p).startswith("blank_")]
+    transparent = [p for p in pngs if not png_has_alpha(p)]
+    assert pngs and not transparent, f"{len(transparent)} of {len(pngs)} overlay PNGs are fully transparent"
+    print(f"overlay PNGs:  {len(pngs)} rendered, all with visible pixels")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="libass burn vs cached PNG overlay burn on a caption-dense synthetic video")
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--quality", default="1080p")
+    parser.add_argument("--every", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from processor import VideoProcessor
+from segmented import SegmentedBurner
+from profiles import plan_render
+from benchmarks.media import make_test_video, make_captions, video_timing
+
+STYLE = {"font_family": "Arial", "font_size": 24, "text_color": "#FFFFFF", "position_y": 15}
+
+
+async def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_burn_")
+    processor = VideoProcessor("flat_fonts", os.path.join(work_dir, "cache"))
+    src = make_test_video(os.path.join(work_dir, "src.mp4"), args.duration, args.width, args.height)
+    captions = make_captions(args.duration)
+
+    processor.segmented = SegmentedBurner(processor, workers=1)
+    out = os.path.join(work_dir, "single.mp4")
+    t0 = time.perf_counter()
+    result = await processor.burn_only(src, out, captions, STYLE, quality=args.quality)
+    assert result["success"], result
+    single_s = time.perf_counter() - t0
+    reference = video_timing(out)
+    print(f"single pass: {single_s:.1f}s  {reference}")
+
+    width, height = await processor._get_video_dimensions(src)
+    plan = plan_render(width, height, args.quality)
+    info = await processor._probe_media(src)
+    workers = 2
+    while workers <= args.max_workers:
+        out = os.path.join(work_dir, f"parallel_{workers}.mp4")
+        t0 = time.perf_counter()
+        ok = await SegmentedBurner(processor, workers=workers).burn(src, out, captions, STYLE, plan, info)
+        elapsed = time.perf_counter() - t0
+        timing = video_timing(out) if ok else None
+        match = "timing matches" if timing == reference else f"TIMING MISMATCH {timing}"
+        print(f"{workers} workers: {elapsed:.1f}s  ({single_s / elapsed:.2f}x)  {match}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-pass vs segmented parallel burn on a synthetic video")
+    parser.add_argument("--duration", type=int, default=120)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--quality", default="1080p")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 2)
+    asyncio.run(main(parser.parse_args()))
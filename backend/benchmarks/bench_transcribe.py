@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import tempfile
+import time
+
+from audio import ExtractedAudio
+from transcription import TranscriptionPipeline
+from benchmarks.fakes import FakeTranscriber
+
+
+async def run(cmd, check=False):
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await proc.communicate()
+    stdout, stderr = stdout.decode(errors="replace"), stderr.decode(errors="replace")
+    if check and proc.returncode != 0:
+        raise Exception(f"{cmd[0]} failed: {stderr}")
+    return proc.returncode, stdout, stderr
+
+
+def make_speech_like_audio(path, duration):
+    # 4 s of tone, 1 s of silence, repeated: gives silencedetect real boundaries.
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"aevalsrc='0.5*sin(440*2*PI*t)*lt(mod(t,5),4)':s=16000:d={duration}",
+        "-ac", "1", path
+    ], check=True)
+
+
+async def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_transcribe_")
+    audio_p = os.path.join(work_dir, "audio.mp3")
+    make_speech_like_audio(audio_p, args.duration)
+
+    for concurrency in (1, args.concurrency):
+        backend = FakeTranscriber(seconds_per_audio_minute=args.latency)
+        pipeline = TranscriptionPipeline(backend, run, max_chunk_seconds=args.chunk_seconds, concurrency=concurrency)
+        t0 = time.perf_counter()
+        with ExtractedAudio.from_file(audio_p) as audio:
+            result = await pipeline.transcribe(audio, args.duration)
+        elapsed = time.perf_counter() - t0
+        ids = [s["id"] for s in result["segments"]]
+        assert ids == list(range(len(ids))), "segment ids are not contiguous"
+        print(f"concurrency {concurrency}: {elapsed:.2f}s  {backend.calls} chunks  {len(ids)} segments")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked transcription against a stub backend")
+    parser.add_argument("--duration", type=int, default=3600)
+    parser.add_argument("--chunk-seconds", type=float, default=600)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake seconds of latency per minute of audio")
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
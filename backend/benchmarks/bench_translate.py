@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import time
+
+from translator import BatchTranslator
+from benchmarks.fakes import FakeChatClient
+
+SAMPLE = "so today we are going to look at how to make the perfect cup of masala chai at home"
+
+
+async def serial(client, segments):
+    out = {}
+    for seg_id, text in segments.items():
+        res = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "system", "content": ""}, {"role": "user", "content": text}]
+        )
+        out[seg_id] = res.choices[0].message.content
+    return out
+
+
+async def main(args):
+    segments = {str(i): f"{SAMPLE} ({i})" for i in range(args.segments)}
+
+    client = FakeChatClient(latency=args.latency)
+    t0 = time.perf_counter()
+    await serial(client, segments)
+    serial_s = time.perf_counter() - t0
+    print(f"serial:  {serial_s:.2f}s  {client.calls} calls")
+
+    client = FakeChatClient(latency=args.latency, drop_rate=args.drop_rate)
+    translator = BatchTranslator(client, max_concurrency=args.concurrency)
+    t0 = time.perf_counter()
+    out = await translator.translate(segments, "Hindi")
+    batched_s = time.perf_counter() - t0
+    assert set(out) == set(segments)
+    print(f"batched: {batched_s:.2f}s  {client.calls} calls  ({serial_s / batched_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serial vs batched segment translation against a fake client")
+    parser.add_argument("--segments", type=int, default=150)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--drop-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeCompletions:
+    def __init__(self, latency, drop_rate, seed):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def create(self, model, messages, response_format=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        content = messages[-1]["content"]
+
+        if response_format is None:
+            return _response(f"[t] {content}")
+
+        batch = json.loads(content)
+        out = {k: f"[t] {v}" for k, v in batch.items() if self.random.random() >= self.drop_rate}
+        return _response(json.dumps(out, ensure_ascii=False))
+
+
+# Stands in for AsyncOpenAI's chat API: fixed latency per call, optional dropped ids.
+class FakeChatClient:
+    def __init__(self, latency=0.05, drop_rate=0.0, seed=0):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency, drop_rate, seed))
+
+    @property
+    def calls(self):
+        return self.chat.completions.calls
+
+
+# Offline transcriber backend: replays a recorded transcript dict (sliced to
+# the chunk's duration) or synthesises one segment per few seconds of audio.
+# Latency scales with audio length, like the real API.
+class FakeTranscriber:
+    model = "fake-whisper"
+
+    def __init__(self, recorded=None, seconds_per_audio_minute=0.5, segment_seconds=4.0):
+        self.recorded = recorded
+        self.seconds_per_audio_minute = seconds_per_audio_minute
+        self.segment_seconds = segment_seconds
+        self.calls = 0
+
+    async def _duration(self, source):
+        # source is a path or an in-memory (filename, bytes) pair.
+        data = source[1] if isinstance(source, tuple) else None
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0",
+            "pipe:0" if data is not None else source,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, _ = await proc.communicate(data)
+        return float(stdout.decode().strip() or 0)
+
+    async def transcribe(self, source):
+        self.calls += 1
+        duration = await self._duration(source)
+        await asyncio.sleep(duration / 60 * self.seconds_per_audio_minute)
+
+        if self.recorded is not None:
+            return {
+                "language": self.recorded.get("language"),
+                "duration": duration,
+                "segments": [s for s in self.recorded["segments"] if s["start"] < duration],
+                "words": [w for w in self.recorded["words"] if w["start"] < duration]
+            }
+
+        segments, words = [], []
+        t = 0.0
+        while t + self.segment_seconds <= duration:
+            text = f"segment {len(segments)} of the synthetic transcript"
+            segments.append({"id": len(segments), "start": t, "end": t + self.segment_seconds, "text": text})
+            step = self.segment_seconds / len(text.split())
+            for i, word in enumerate(text.split()):
+                words.append({"word": word, "start": t + i * step, "end": t + (i + 1) * step})
+            t += self.segment_seconds
+        return {"language": "english", "duration": duration, "segments": segments, "words": words}
+
+
+class _FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.values = None
+        self.op = "select"
+        self.one = False
+
+    def select(self, columns="*"):
+        self.columns = [c.strip() for c in columns.split(",")] if columns != "*" else None
+        return self
+
+    def insert(self, values):
+        self.op, self.values = "insert", values
+        return self
+
+    def update(self, values):
+        self.op, self.values = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def execute(self):
+        return self.db._call(self._apply)
+
+    def _apply(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.op == "insert":
+            new = [dict(v) for v in (self.values if isinstance(self.values, list) else [self.values])]
+            rows.extend(new)
+            return [dict(r) for r in new]
+        matched = [r for r in rows if all(r.get(c) == v for c, v in self.filters)]
+        if self.op == "update":
+            for r in matched:
+                r.update(self.values)
+            return [dict(r) for r in matched]
+        data = [{c: r.get(c) for c in self.columns} if self.columns else dict(r) for r in matched]
+        if self.one:
+            if len(data) != 1:
+                raise Exception(f"Expected one row from {self.table}, got {len(data)}")
+            return data[0]
+        return data
+
+
+class _FakeRpc:
+    def __init__(self, db, fn, params):
+        self.db = db
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        return self.db._call(lambda: getattr(self.db, f"_rpc_{self.fn}")(**self.params))
+
+
+# Synchronous in-process stand-in for the supabase client: table queries
+# over plain dict rows and the credit RPCs from the credit ledger migration.
+# Every execute() is one "round trip" with a fixed latency.
+class FakeSupabase:
+    def __init__(self, credits=None, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.tables = {
+            "user_profiles": [
+                {"id": uid, "credits_remaining": c, "total_credits_purchased": 0, "subscription_plan": "free"}
+                for uid, c in (credits or {}).items()
+            ],
+            "credit_reservations": [],
+        }
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+    def rpc(self, fn, params):
+        return _FakeRpc(self, fn, params)
+
+    def _call(self, fn):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            return SimpleNamespace(data=fn())
+
+    def _profile(self, user_id):
+        return next((r for r in self.tables["user_profiles"] if r["id"] == user_id), None)
+
+    def _reservation(self, reservation_id):
+        return next((r for r in self.tables["credit_reservations"] if r["id"] == reservation_id), None)
+
+    def _rpc_reserve_credits(self, p_user_id, p_amount, p_reservation_id=None):
+        profile = self._profile(p_user_id)
+        existing = self._reservation(p_reservation_id) if p_reservation_id else None
+        if existing:
+            reservation_id = None if existing["status"] == "refunded" else existing["id"]
+            return {"reservation_id": reservation_id, "credits_remaining": profile["credits_remaining"] if profile else 0}
+        if not profile or profile["credits_remaining"] < p_amount:
+            return {"reservation_id": None, "credits_remaining": profile["credits_remaining"] if profile else 0}
+        profile["credits_remaining"] -= p_amount
+        reservation = {
+            "id": p_reservation_id or str(uuid.uuid4()), "user_id": p_user_id, "amount": p_amount,
+            "status": "reserved", "created_at": time.time()
+        }
+        self.tables["credit_reservations"].append(reservation)
+        return {"reservation_id": reservation["id"], "credits_remaining": profile["credits_remaining"]}
+
+    def _rpc_cancel_reservation(self, p_reservation_id, p_user_id, p_amount):
+        if self._reservation(p_reservation_id):
+            return self._rpc_refund_credits(p_reservation_id)
+        self.tables["credit_reservations"].append({
+            "id": p_reservation_id, "user_id": p_user_id, "amount": p_amount,
+            "status": "refunded", "created_at": time.time()
+        })
+        profile = self._profile(p_user_id)
+        return {"refunded": False, "credits_remaining": profile["credits_remaining"] if profile else None}
+
+    def _rpc_expire_reservations(self, p_max_age_seconds):
+        cutoff = time.time() - p_max_age_seconds
+        expired = 0
+        for reservation in self.tables["credit_reservations"]:
+            if reservation["status"] == "reserved" and reservation["created_at"] < cutoff:
+                reservation["status"] = "refunded"
+                self._profile(reservation["user_id"])["credits_remaining"] += reservation["amount"]
+                expired += 1
+        return {"expired": expired}
+
+    def _rpc_commit_credits(self, p_reservation_id):
+        reservation = self._reservation(p_reservation_id)
+        committed = bool(reservation) and reservation["status"] == "reserved"
+        if committed:
+            reservation["status"] = "committed"
+        profile = self._profile(reservation["user_id"]) if reservation else None
+        return {"committed": committed, "credits_remaining": profile["credits_remaining"] if profile else None}
+
+    def _rpc_refund_credits(self, p_reservation_id):
+        reservation = self._reservation(p_reservation_id)
+        profile = self._profile(reservation["user_id"]) if reservation else None
+        if not reservation or reservation["status"] != "reserved":
+            return {"refunded": False, "credits_remaining": profile["credits_remaining"] if profile else None}
+        reservation["status"] = "refunded"
+        profile["credits_remaining"] += reservation["amount"]
+        return {"refunded": True, "credits_remaining": profile["credits_remaining"]}
+
+    def _rpc_add_credits(self, p_user_id, p_amount):
+        profile = self._profile(p_user_id)
+        if not profile:
+            return {"credits_remaining": None}
+        profile["credits_remaining"] += p_amount
+        profile["total_credits_purchased"] += p_amount
+        return {"credits_remaining": profile["credits_remaining"]}
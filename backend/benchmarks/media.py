@@ -0,0 +1,66 @@
+import json
+import os
+import struct
+import subprocess
+import zlib
+
+
+def make_test_video(path, duration, width, height, fps=30, gop=60):
+    if os.path.exists(path):
+        return path
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest",
+        path
+    ], check=True)
+    return path
+
+
+def make_captions(duration, every=1.5, text="the quick brown fox jumps"):
+    captions = []
+    t = 0.0
+    while t + every <= duration:
+        captions.append({"id": str(len(captions)), "text": f"{text} {len(captions)}", "start_time": t, "end_time": t + every * 0.9})
+        t += every
+    return captions
+
+
+def png_has_alpha(path):
+    # True if any pixel of an 8-bit RGBA PNG is not fully transparent. PNG
+    # row filters predict each byte from the same channel of earlier pixels,
+    # so the alpha lane of the filtered data is all zero exactly when the
+    # alpha channel is, and rows don't need unfiltering.
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 8
+    idat = []
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            width, height, depth, color = struct.unpack(">IIBB", body[:10])
+        elif kind == b"IDAT":
+            idat.append(body)
+    if depth != 8 or color != 6:
+        raise ValueError(f"{path} is not 8-bit RGBA")
+    raw = zlib.decompress(b"".join(idat))
+    stride = width * 4 + 1
+    return any(any(raw[row * stride + 4::4][:width]) for row in range(height))
+
+
+def video_timing(path):
+    out = subprocess.run([
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-count_packets", "-show_entries", "stream=nb_read_packets,r_frame_rate:format=duration",
+        "-of", "json", path
+    ], capture_output=True, text=True, check=True).stdout
+    data = json.loads(out)
+    return {
+        "frames": int(data["streams"][0]["nb_read_packets"]),
+        "frame_rate": data["streams"][0]["r_frame_rate"],
+        "duration": round(float(data["format"]["duration"]), 2)
+    }
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from processor import VideoProcessor
+from chunking import CaptionChunker
+from metrics import current_job
+from benchmarks.fakes import FakeChatClient, FakeTranscriber
+from benchmarks.media import make_test_video, make_captions
+
+STYLE = {"font_family": "Arial", "font_size": 24, "text_color": "#FFFFFF", "position_y": 15}
+FPS = 30
+
+
+class StageRecorder:
+    # Stands in for a Job so stage() timings and encode progress land here.
+    def __init__(self):
+        self.stages = {}
+        self.progress = None
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS; both are high-water
+    # marks for the whole run so far, children = largest ffmpeg seen.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+
+async def measure(name, fn, units, unit_name, **params):
+    recorder = StageRecorder()
+    token = current_job.set(recorder)
+    t0 = time.perf_counter()
+    try:
+        await fn()
+    finally:
+        current_job.reset(token)
+    elapsed = time.perf_counter() - t0
+    result = {
+        "name": name,
+        "params": params,
+        "seconds": round(elapsed, 4),
+        "throughput": {"value": round(units / elapsed, 2) if elapsed else None, "unit": f"{unit_name}/s"},
+        "stages": {k: round(v, 4) for k, v in recorder.stages.items()},
+        "peak_rss_mb": peak_rss_mb()
+    }
+    print(f"{name:<40} {elapsed:8.3f}s  {result['throughput']['value']} {unit_name}/s")
+    return result
+
+
+def synthetic_transcript(duration, segment_seconds=4.0):
+    segments, words = [], []
+    t = 0.0
+    while t + segment_seconds <= duration:
+        text = f"segment {len(segments)} of the synthetic transcript for benchmarking"
+        segments.append({"id": len(segments), "start": t, "end": t + segment_seconds, "text": text})
+        step = segment_seconds / len(text.split())
+        for i, word in enumerate(text.split()):
+            words.append({"word": word, "start": t + i * step, "end": t + (i + 1) * step})
+        t += segment_seconds
+    return {"language": "english", "duration": duration, "segments": segments, "words": words}
+
+
+async def bench_chunking(transcript):
+    chunker = CaptionChunker()
+    words = transcript["words"]
+
+    async def run():
+        chunker.chunk(transcript["segments"], words)
+
+    return await measure("chunk", run, len(words), "words", words=len(words))
+
+
+async def bench_ass(processor, captions):
+    async def run():
+        os.remove(processor._create_inline_ass(captions, STYLE, 1920, 1080))
+
+    return await measure("ass", run, len(captions), "captions", captions=len(captions))
+
+
+async def bench_captions(work_dir, src, width, height, duration, language, recorded, latency):
+    # A fresh cache per run so the transcript and translation caches miss.
+    processor = VideoProcessor("flat_fonts", tempfile.mkdtemp(dir=work_dir))
+    processor.transcriber.backend = FakeTranscriber(recorded, seconds_per_audio_minute=latency)
+    processor.translator.client = FakeChatClient(latency=latency / 10)
+
+    async def run():
+        result = await processor.generate_captions_only(src, target_language=language)
+        assert result["success"], result
+
+    name = f"captions/{language.lower()}/{width}x{height}/{duration}s"
+    return await measure(name, run, duration, "video_s", width=width, height=height, duration=duration, language=language)
+
+
+async def bench_burn(work_dir, src, width, height, duration, quality):
+    processor = VideoProcessor("flat_fonts", tempfile.mkdtemp(dir=work_dir))
+    captions = make_captions(duration)
+    out = os.path.join(work_dir, f"burn_{quality}_{width}x{height}_{duration}.mp4")
+
+    async def run():
+        result = await processor.burn_only(src, out, captions, STYLE, quality=quality)
+        assert result["success"], result
+
+    name = f"burn/{quality}/{width}x{height}/{duration}s"
+    return await measure(name, run, duration * FPS, "frames", width=width, height=height, duration=duration, quality=quality)
+
+
+async def bench_batch(work_dir, src, width, height, duration, quality, count):
+    # N renders of the same clip from one decode (split branches).
+    processor = VideoProcessor("flat_fonts", tempfile.mkdtemp(dir=work_dir))
+    outputs = [
+        (os.path.join(work_dir, f"batch_{i}_{quality}_{width}x{height}_{duration}.mp4"), make_captions(duration))
+        for i in range(count)
+    ]
+
+    async def run():
+        result = await processor.burn_multi(src, outputs, STYLE, quality=quality)
+        assert result["success"], result
+
+    name = f"batch/{count}x{quality}/{width}x{height}/{duration}s"
+    return await measure(name, run, duration * FPS * count, "frames", width=width, height=height, duration=duration, quality=quality, outputs=count)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    recorded = None
+    if args.recorded:
+        with open(args.recorded, "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+
+    results = []
+    transcript = recorded or synthetic_transcript(max(args.durations) * 10)
+    results.append(await bench_chunking(transcript))
+    processor = VideoProcessor("flat_fonts", os.path.join(work_dir, "cache"))
+    results.append(await bench_ass(processor, make_captions(3600, every=1.0)))
+
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found: skipping caption and export benchmarks")
+    else:
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.split("x"))
+            for duration in args.durations:
+                src = make_test_video(os.path.join(work_dir, f"src_{width}x{height}_{duration}.mp4"), duration, width, height, fps=FPS)
+                for language in args.languages:
+                    results.append(await bench_captions(work_dir, src, width, height, duration, language, recorded, args.latency))
+                for quality in args.qualities:
+                    results.append(await bench_burn(work_dir, src, width, height, duration, quality))
+                    if len(args.languages) > 1:
+                        results.append(await bench_batch(work_dir, src, width, height, duration, quality, len(args.languages)))
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(old_p, new_p):
+    with open(old_p, "r", encoding="utf-8") as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_p, "r", encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    for r in new:
+        before = old.get(r["name"])
+        if before is None or not before["seconds"]:
+            print(f"{r['name']:<40} {r['seconds']:8.3f}s  (new)")
+            continue
+        change = (r["seconds"] - before["seconds"]) / before["seconds"] * 100
+        print(f"{r['name']:<40} {before['seconds']:8.3f}s -> {r['seconds']:8.3f}s  {change:+6.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline caption and export pipeline benchmarks with JSON output")
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720", "1920x1080"])
+    parser.add_argument("--durations", nargs="+", type=int, default=[30, 120])
+    parser.add_argument("--qualities", nargs="+", default=["draft", "1080p"])
+    parser.add_argument("--languages", nargs="+", default=["English", "Hindi"])
+    parser.add_argument("--recorded", help="transcript JSON (segments + words) to replay instead of synthetic text")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake transcription seconds per minute of audio")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="print per-benchmark deltas between two result files")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,113 @@
+import math
+import os
+
+MAX_CAPTION_CHARS = int(os.getenv("MAX_CAPTION_CHARS", 32))
+MAX_CAPTION_WORDS = int(os.getenv("MAX_CAPTION_WORDS", 5))
+MAX_CAPTION_SECONDS = float(os.getenv("MAX_CAPTION_SECONDS", 3.5))
+MIN_CAPTION_GAP = float(os.getenv("MIN_CAPTION_GAP", 0.0))
+# Whisper word times can straddle segment edges by a few milliseconds.
+SEGMENT_TOLERANCE = 0.05
+
+
+class CaptionChunker:
+    # Turns Whisper segments + word timestamps into caption dicts in one pass
+    # over the word array. Untranslated text is cut on real word timings;
+    # translated text has no word timings of its own, so it is spread over
+    # the segment's spoken span in proportion to character length.
+    def __init__(self, max_chars=MAX_CAPTION_CHARS, max_duration=MAX_CAPTION_SECONDS, min_gap=MIN_CAPTION_GAP, max_words=MAX_CAPTION_WORDS):
+        self.max_chars = max_chars
+        self.max_duration = max_duration
+        self.min_gap = min_gap
+        self.max_words = max_words
+
+    def chunk(self, segments, words, texts=None):
+        captions = []
+        w = 0
+        for n, seg in enumerate(segments):
+            seg_start = float(seg["start"])
+            seg_end = float(seg["end"])
+
+            seg_words = []
+            while w < len(words) and float(words[w]["start"]) < seg_end - SEGMENT_TOLERANCE:
+                seg_words.append(words[w])
+                w += 1
+            while w < len(words) and float(words[w]["start"]) < seg_end and float(words[w]["end"]) <= seg_end + SEGMENT_TOLERANCE:
+                seg_words.append(words[w])
+                w += 1
+
+            source = seg["text"].strip()
+            text = (texts[n] if texts else None) or source
+            tokens = text.split()
+            if not tokens:
+                continue
+
+            if seg_words and text == source:
+                timed = self._align_tokens(tokens, seg_words)
+            else:
+                span_start = float(seg_words[0]["start"]) if seg_words else seg_start
+                span_end = float(seg_words[-1]["end"]) if seg_words else seg_end
+                timed = self._proportional(tokens, span_start, max(span_end, span_start))
+
+            for chunk_text, start, end in self._group(timed):
+                self._append(captions, chunk_text, start, end)
+        return captions
+
+    def _align_tokens(self, tokens, seg_words):
+        # Prefer the segment text's tokens (they keep punctuation) when they
+        # line up one-to-one with Whisper's words; otherwise use the words.
+        if len(tokens) != len(seg_words):
+            tokens = [str(wd["word"]).strip() for wd in seg_words]
+        return [(tok, float(wd["start"]), float(wd["end"])) for tok, wd in zip(tokens, seg_words) if tok]
+
+    def _proportional(self, tokens, start, end):
+        total = sum(len(t) + 1 for t in tokens)
+        duration = end - start
+        timed = []
+        pos = 0
+        for tok in tokens:
+            t0 = start + duration * pos / total
+            pos += len(tok) + 1
+            timed.append((tok, t0, start + duration * pos / total))
+        return timed
+
+    def _group(self, timed):
+        # Greedy cut: close the chunk when the next token would break the char,
+        # word or duration budget. Balanced so the last chunk is not a stub.
+        total_chars = sum(len(t) + 1 for t, _, _ in timed) - 1
+        span = timed[-1][2] - timed[0][1]
+        count = max(
+            math.ceil(total_chars / self.max_chars),
+            math.ceil(len(timed) / self.max_words),
+            math.ceil(span / self.max_duration) if self.max_duration > 0 else 1,
+            1
+        )
+        target_chars = total_chars / count
+
+        chunk = []
+        chars = 0
+        for tok, start, end in timed:
+            if chunk:
+                next_chars = chars + 1 + len(tok)
+                if (next_chars > self.max_chars
+                        or len(chunk) >= self.max_words
+                        or end - chunk[0][1] > self.max_duration
+                        or chars >= target_chars):
+                    yield " ".join(t for t, _, _ in chunk), chunk[0][1], chunk[-1][2]
+                    chunk = []
+                    chars = 0
+            chars = chars + 1 + len(tok) if chunk else len(tok)
+            chunk.append((tok, start, end))
+        if chunk:
+            yield " ".join(t for t, _, _ in chunk), chunk[0][1], chunk[-1][2]
+
+    def _append(self, captions, text, start, end):
+        if captions and self.min_gap > 0:
+            prev = captions[-1]
+            if start - prev["end_time"] < self.min_gap:
+                prev["end_time"] = max(prev["start_time"], start - self.min_gap)
+        captions.append({
+            "id": str(len(captions)),
+            "text": text,
+            "start_time": start,
+            "end_time": max(end, start)
+        })
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+CREDIT_CACHE_TTL = float(os.getenv("CREDIT_CACHE_TTL", 10))
+PROFILE_COLUMNS = "credits_remaining, subscription_plan"
+# A reservation still open after this long belongs to an export that will
+# never settle it (crash, restart, lost response) and is refunded.
+RESERVATION_TTL_SECONDS = int(float(os.getenv("CREDIT_RESERVATION_TTL_HOURS", 6)) * 3600)
+RESERVATION_SWEEP_SECONDS = float(os.getenv("CREDIT_RESERVATION_SWEEP_SECONDS", 600))
+
+
+class InsufficientCreditsError(Exception):
+    def __init__(self, needed, available):
+        super().__init__(f"Insufficient credits. You need {needed} credits but have {available}. Please purchase more credits.")
+        self.needed = needed
+        self.available = available
+
+
+class ReservationSettledError(Exception):
+    pass
+
+
+class CreditLedger:
+    # Balance reads go through a short-TTL per-user cache; every write is a
+    # single atomic RPC (see the credit_reservations migration) whose returned
+    # balance replaces the cached one. An export reserves its credits up
+    # front, then commits them on success or refunds them on failure.
+    def __init__(self, client, ttl=CREDIT_CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._profiles = {}
+
+    def profile(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._profiles.get(user_id)
+            if cached and cached[0] > now:
+                self.hits += 1
+                return dict(cached[1])
+            self.misses += 1
+
+        response = self.client.table("user_profiles").select(PROFILE_COLUMNS).eq("id", user_id).single().execute()
+        data = response.data or {}
+        profile = {
+            "credits_remaining": data.get("credits_remaining", 0),
+            "subscription_plan": data.get("subscription_plan", "free")
+        }
+        with self._lock:
+            self._profiles[user_id] = (now + self.ttl, profile)
+        return dict(profile)
+
+    def balance(self, user_id):
+        return self.profile(user_id)["credits_remaining"]
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+    def _set_balance(self, user_id, credits):
+        with self._lock:
+            cached = self._profiles.get(user_id)
+            if credits is None or not cached:
+                self._profiles.pop(user_id, None)
+                return
+            cached[1]["credits_remaining"] = credits
+
+    def _rpc(self, fn, params):
+        return self.client.rpc(fn, params).execute().data or {}
+
+    def reserve(self, user_id, amount, reservation_id=None):
+        # Repeating a call with the same reservation_id never reserves twice.
+        reservation_id = reservation_id or str(uuid.uuid4())
+        data = self._rpc("reserve_credits", {"p_user_id": user_id, "p_amount": amount, "p_reservation_id": reservation_id})
+        self._set_balance(user_id, data.get("credits_remaining"))
+        if not data.get("reservation_id"):
+            raise InsufficientCreditsError(amount, data.get("credits_remaining", 0))
+        return data["reservation_id"]
+
+    def cancel(self, user_id, reservation_id, amount):
+        # Refunds a reservation whose reserve call may or may not have run;
+        # if it hasn't yet, it will take nothing when it does.
+        data = self._rpc("cancel_reservation", {"p_reservation_id": reservation_id, "p_user_id": user_id, "p_amount": amount})
+        self._set_balance(user_id, data.get("credits_remaining"))
+        return data.get("credits_remaining")
+
+    def expire(self, max_age_seconds):
+        expired = self._rpc("expire_reservations", {"p_max_age_seconds": int(max_age_seconds)}).get("expired", 0)
+        if expired:
+            with self._lock:
+                self._profiles.clear()
+        return expired
+
+    def commit(self, user_id, reservation_id):
+        data = self._rpc("commit_credits", {"p_reservation_id": reservation_id})
+        self._set_balance(user_id, data.get("credits_remaining"))
+        if not data.get("committed"):
+            # Already refunded (e.g. expired) or unknown: nothing was charged.
+            raise ReservationSettledError(f"Reservation {reservation_id} is no longer open")
+        return data.get("credits_remaining")
+
+    def refund(self, user_id, reservation_id):
+        data = self._rpc("refund_credits", {"p_reservation_id": reservation_id})
+        self._set_balance(user_id, data.get("credits_remaining"))
+        return data.get("credits_remaining")
+
+    def add(self, user_id, amount):
+        data = self._rpc("add_credits", {"p_user_id": user_id, "p_amount": amount})
+        self._set_balance(user_id, data.get("credits_remaining"))
+        return data.get("credits_remaining")
+
+    def stats(self):
+        return {"cached_users": len(self._profiles), "hits": self.hits, "misses": self.misses}
+
+
+class ReservationExpiry:
+    # Refunds reservations left open past ttl, once at startup and then
+    # every interval.
+    def __init__(self, store, ledger, ttl=RESERVATION_TTL_SECONDS, interval=RESERVATION_SWEEP_SECONDS):
+        self.store = store
+        self.ledger = ledger
+        self.ttl = ttl
+        self.interval = interval
+        self.expired = 0
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                expired = await self.store.run(self.ledger.expire, self.ttl)
+                if expired:
+                    self.expired += expired
+                    print(f"💳 Refunded {expired} abandoned credit reservations")
+            except Exception as e:
+                print(f"Credit reservation expiry failed: {e}")
+            await asyncio.sleep(self.interval)
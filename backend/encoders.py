@@ -0,0 +1,47 @@
+import os
+
+CPU_COUNT = os.cpu_count() or 1
+# Concurrent encodes allowed on this node; each one gets an equal share of
+# the cores so parallel exports never oversubscribe the CPU.
+ENCODE_SLOTS = int(os.getenv("ENCODE_SLOTS", max(1, CPU_COUNT // 4)))
+SLOT_THREADS = max(1, CPU_COUNT // ENCODE_SLOTS)
+# Source audio that can go into the MP4 untouched.
+COPY_AUDIO_CODECS = {"aac", "mp3"}
+
+
+class X264Encoder:
+    name = "x264"
+
+    def video_args(self, plan, threads=SLOT_THREADS):
+        args = ["-c:v", "libx264", "-preset", plan["preset"], "-crf", str(plan["crf"]), "-threads", str(threads)]
+        if plan.get("tune"):
+            args += ["-tune", plan["tune"]]
+        return args
+
+
+class X264DraftEncoder(X264Encoder):
+    # Instant-preview path: no B-frames, no lookahead, fast decode.
+    name = "x264-draft"
+
+    def video_args(self, plan, threads=SLOT_THREADS):
+        return [
+            "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency,fastdecode",
+            "-crf", str(plan["crf"]), "-threads", str(threads)
+        ]
+
+
+ENCODERS = {
+    X264Encoder.name: X264Encoder(),
+    X264DraftEncoder.name: X264DraftEncoder(),
+}
+
+
+def get_encoder(plan):
+    name = os.getenv("EXPORT_ENCODER") or plan.get("encoder", X264Encoder.name)
+    return ENCODERS.get(name, ENCODERS[X264Encoder.name])
+
+
+def audio_args(plan, source_codec=None):
+    if source_codec in COPY_AUDIO_CODECS:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac", "-b:a", plan["audio_bitrate"]]
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+from profiles import EXPORT_PROFILES, DEFAULT_QUALITY
+
+EXPORT_CACHE_BYTES = int(os.getenv("EXPORT_CACHE_MB", 10240)) * 1024 * 1024
+KEY_RE = re.compile(r"^[0-9a-f]{64}\.mp4$")
+
+
+def normalize_captions(captions):
+    # Caption ids and list order don't change the rendered video.
+    return sorted(
+        (round(float(c['start_time']), 3), round(float(c['end_time']), 3), str(c['text']))
+        for c in captions
+    )
+
+
+def export_key(source_key, captions, style, quality):
+    name = quality if quality in EXPORT_PROFILES else DEFAULT_QUALITY
+    payload = json.dumps(
+        [source_key, normalize_captions(captions), style, name, EXPORT_PROFILES[name], os.getenv("EXPORT_ENCODER")],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExportCache:
+    # Finished exports live in the exports dir as {key}.mp4, evicted
+    # least-recently-used first past max_bytes. Identical exports that are
+    # requested while one is still encoding wait on that encode instead of
+    # starting their own.
+    def __init__(self, directory, max_bytes=EXPORT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._inflight = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not KEY_RE.match(name):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            files.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def filename(self, key):
+        return f"{key}.mp4"
+
+    def path(self, key):
+        return os.path.join(self.directory, self.filename(key))
+
+    def touch(self, key):
+        if key not in self._entries:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            self._size -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    def lookup(self, key):
+        path = self.touch(key)
+        if path:
+            self.hits += 1
+        return path
+
+    async def get_or_create(self, key, produce):
+        # produce(output_path) -> {"success": ...}; only successful outputs
+        # are kept.
+        if self.lookup(key):
+            return {"success": True, "cached": True}
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        partial = self._partial(key)
+        result = {"success": False, "error": "Export cancelled"}
+        try:
+            result = await produce(partial)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            result = self._finish(key, result)
+        return {**result, "cached": False}
+
+    async def get_or_create_many(self, keys, produce):
+        # Several exports rendered together: produce({key: output_path}) ->
+        # {key: {"success": ...}} is called once with only the keys that are
+        # neither cached nor already being encoded elsewhere.
+        results = {}
+        waiting = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            if self.lookup(key):
+                results[key] = {"success": True, "cached": True}
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            self.misses += len(missing)
+            loop = asyncio.get_running_loop()
+            for key in missing:
+                self._inflight[key] = loop.create_future()
+            produced = {}
+            try:
+                produced = await produce({key: self._partial(key) for key in missing})
+            except Exception as e:
+                produced = {key: {"success": False, "error": str(e)} for key in missing}
+            finally:
+                for key in missing:
+                    result = self._finish(key, produced.get(key, {"success": False, "error": "Export cancelled"}))
+                    results[key] = {**result, "cached": False}
+
+        for key, pending in waiting.items():
+            results[key] = await asyncio.shield(pending)
+        return results
+
+    def _partial(self, key):
+        return os.path.join(self.directory, f".{key}.partial.mp4")
+
+    def _finish(self, key, result):
+        # Publishes a successful output under its key and wakes any waiters.
+        future = self._inflight.pop(key)
+        partial = self._partial(key)
+        try:
+            if result.get("success"):
+                os.replace(partial, self.path(key))
+                self._add(key)
+        except OSError as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+            future.set_result(result)
+        return result
+
+    def artifacts(self):
+        # (key, path, size) for every finished export, least recently used first.
+        return [(key, self.path(key), size) for key, size in self._entries.items()]
+
+    def discard(self, key):
+        size = self._entries.pop(key, None)
+        if size is None:
+            return
+        self._size -= size
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def _add(self, key):
+        size = os.path.getsize(self.path(key))
+        self._size += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            oldest, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            self.evictions += 1
+            try:
+                os.remove(self.path(oldest))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
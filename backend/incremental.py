@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import shutil
+
+from cache import atomic_write
+
+INCREMENTAL_SEGMENT_SECONDS = float(os.getenv("INCREMENTAL_SEGMENT_SECONDS", 20))
+
+
+def _caption_key(c):
+    return (round(float(c['start_time']), 3), round(float(c['end_time']), 3), str(c['text']))
+
+
+def _style_key(style, plan):
+    return json.dumps({"style": style, "plan": plan}, sort_keys=True, default=str)
+
+
+def changed_ranges(old_captions, new_captions):
+    # Captions present in only one of the two lists are the damage: the old
+    # one has to be erased and the new one drawn.
+    old = {_caption_key(c) for c in old_captions}
+    new = {_caption_key(c) for c in new_captions}
+    return sorted((start, end) for start, end, _ in old ^ new)
+
+
+def dirty_segments(segments, ranges):
+    dirty = set()
+    for i, seg in enumerate(segments):
+        for start, end in ranges:
+            if start < seg["end"] and end > seg["start"]:
+                dirty.add(i)
+                break
+    return dirty
+
+
+class IncrementalExporter:
+    # Keeps the stream-copied source segments and their burned encodes from
+    # the last successful export of each file_id. A re-export only re-encodes
+    # the segments whose captions changed and concats the rest as-is.
+    # Kept state is bounded by StorageManager (STORAGE_INCREMENTAL_MAX_GB).
+    def __init__(self, burner, state_dir):
+        self.burner = burner
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self._locks = {}
+
+    def _dir(self, file_id):
+        return os.path.join(self.state_dir, file_id)
+
+    def _manifest_path(self, file_id):
+        return os.path.join(self._dir(file_id), "manifest.json")
+
+    def _load_manifest(self, file_id, input_p):
+        try:
+            with open(self._manifest_path(file_id), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        st = os.stat(input_p)
+        if manifest.get("input") != [os.path.abspath(input_p), st.st_size, st.st_mtime]:
+            return None
+        work_dir = self._dir(file_id)
+        for i, seg in enumerate(manifest["segments"]):
+            if not os.path.exists(seg["path"]) or not os.path.exists(os.path.join(work_dir, f"enc_{i:04d}.mp4")):
+                return None
+        return manifest
+
+    def _save_manifest(self, file_id, input_p, segments, captions, style_key):
+        st = os.stat(input_p)
+        manifest = {
+            "input": [os.path.abspath(input_p), st.st_size, st.st_mtime],
+            "segments": segments,
+            "captions": [{"start_time": c['start_time'], "end_time": c['end_time'], "text": c['text']} for c in captions],
+            "style_key": style_key
+        }
+        atomic_write(self._manifest_path(file_id), json.dumps(manifest, ensure_ascii=False))
+
+    def discard(self, file_id):
+        shutil.rmtree(self._dir(file_id), ignore_errors=True)
+
+    def busy(self, file_id):
+        lock = self._locks.get(file_id)
+        return lock is not None and lock.locked()
+
+    def states(self):
+        # (last_used, size, file_id) per kept file_id, least recently used first.
+        items = []
+        with os.scandir(self.state_dir) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_dir():
+                        continue
+                    last_used = entry.stat().st_mtime
+                except OSError:
+                    continue
+                size = 0
+                for root, _, files in os.walk(entry.path):
+                    for name in files:
+                        try:
+                            st = os.stat(os.path.join(root, name))
+                        except OSError:
+                            continue
+                        size += st.st_size
+                        if name == "manifest.json":
+                            last_used = st.st_mtime
+                items.append((last_used, size, entry.name))
+        return sorted(items)
+
+    async def export(self, file_id, input_p, output_p, captions, style, plan, info, progress=None):
+        lock = self._locks.setdefault(file_id, asyncio.Lock())
+        async with lock:
+            work_dir = self._dir(file_id)
+            style_key = _style_key(style, plan)
+            manifest = self._load_manifest(file_id, input_p)
+
+            if manifest is None:
+                self.discard(file_id)
+                os.makedirs(work_dir, exist_ok=True)
+                count = max(self.burner.workers, int(info["duration"] // INCREMENTAL_SEGMENT_SECONDS))
+                segments = await self.burner.plan_and_split(input_p, captions, style, info, work_dir, count=count)
+                if not segments:
+                    self.discard(file_id)
+                    return False
+                only = None
+                print(f"🧩 Full segmented export: {len(segments)} segments")
+            else:
+                segments = manifest["segments"]
+                if manifest["style_key"] != style_key:
+                    only = None
+                    print(f"🧩 Style or quality changed, re-encoding all {len(segments)} segments")
+                else:
+                    only = dirty_segments(segments, changed_ranges(manifest["captions"], captions))
+                    print(f"♻️ Incremental export: re-encoding {len(only)} of {len(segments)} segments")
+
+            try:
+                encoded = await self.burner.encode_segments(segments, captions, style, plan, work_dir, only=only, progress=progress)
+                await self.burner.concat(encoded, input_p, output_p, info.get("audio_codec"), plan, work_dir)
+            except Exception:
+                # Some encodes may have been replaced; the manifest no longer
+                # describes what is on disk, so start clean next time.
+                self.discard(file_id)
+                raise
+
+            self._save_manifest(file_id, input_p, segments, captions, style_key)
+            return True
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+import uuid
+
+from metrics import METRICS, current_job
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.cpu_count() or 2))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", 3600))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, meta=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {}
+        self.progress = None
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": {k: round(v, 3) for k, v in self.stages.items()},
+            "progress": self.progress,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, ttl=JOB_TTL_SECONDS):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🧵 Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind, fn, *args, meta=None, **kwargs):
+        self._prune()
+        job = Job(kind, meta)
+        try:
+            self._queue.put_nowait((job, fn, args, kwargs))
+        except asyncio.QueueFull:
+            raise QueueFullError("Server is busy, please retry shortly")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def counts(self):
+        queued = self._queue.qsize() if self._queue else 0
+        running = sum(1 for j in self.jobs.values() if j.status == "running")
+        return queued, running
+
+    async def _worker(self):
+        while True:
+            job, fn, args, kwargs = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            token = current_job.set(job)
+            try:
+                result = await fn(*args, **kwargs)
+                job.result = result
+                if isinstance(result, dict) and result.get("success") is False:
+                    job.status = "failed"
+                    job.error = result.get("error")
+                else:
+                    job.status = "completed"
+            except Exception as e:
+                print(f"Job {job.id} ({job.kind}) crashed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                current_job.reset(token)
+                job.finished_at = time.time()
+                METRICS.inc("jobs_total", kind=job.kind, status=job.status)
+                METRICS.observe("job_seconds", job.finished_at - job.started_at, kind=job.kind)
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [jid for jid, j in self.jobs.items() if j.done and j.finished_at < cutoff]
+        for jid in expired:
+            del self.jobs[jid]
@@ -1,17 +1,27 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Request
+from fastapi.responses import FileResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from supabase import create_client, Client
 import razorpay
-import shutil
+import asyncio
 import os
+import mimetypes
 import uuid
 import hmac
 import hashlib
 from typing import List, Dict, Any, Optional
 from processor import VideoProcessor
+from jobs import JobQueue, QueueFullError
+from uploads import UploadManager, UploadError, parse_content_range
+from upload_index import UploadIndex
+from preview import PreviewRenderer
+from export_cache import ExportCache, export_key
+from credits import CreditLedger, InsufficientCreditsError, ReservationExpiry
+from store import Store, ExportLog
+from metrics import METRICS, stage
+from storage import StorageManager
+from downloads import file_response
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -29,15 +39,31 @@ app.add_middleware(
 UPLOAD_DIR = "backend/uploads"
 EXPORT_DIR = "backend/exports"
 FONTS_DIR = "backend/flat_fonts"
+CACHE_DIR = "backend/cache"
+MAX_BATCH_LANGUAGES = int(os.getenv("MAX_BATCH_LANGUAGES", 8))
 
-for d in [UPLOAD_DIR, EXPORT_DIR, FONTS_DIR]:
+for d in [UPLOAD_DIR, EXPORT_DIR, FONTS_DIR, CACHE_DIR]:
     os.makedirs(d, exist_ok=True)
 
-processor = VideoProcessor(FONTS_DIR)
+upload_index = UploadIndex(UPLOAD_DIR, os.path.join(CACHE_DIR, "upload_index.json"))
+processor = VideoProcessor(FONTS_DIR, CACHE_DIR, index=upload_index)
+job_queue = JobQueue()
+upload_manager = UploadManager(UPLOAD_DIR, upload_index, os.path.join(CACHE_DIR, "partial_uploads"))
+preview_renderer = PreviewRenderer(processor)
+export_cache = ExportCache(EXPORT_DIR)
+storage = StorageManager(upload_index, export_cache, processor, partial_dir=upload_manager.partial_dir)
 
 supabase_url = os.getenv("VITE_SUPABASE_URL")
-supabase_key = os.getenv("VITE_SUPABASE_ANON_KEY")
+# The credit RPCs are only executable with the service role key.
+supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY")
 supabase: Client = create_client(supabase_url, supabase_key)
+credit_ledger = CreditLedger(supabase)
+store = Store(supabase)
+export_log = ExportLog(store)
+reservation_expiry = ReservationExpiry(store, credit_ledger)
+
+METRICS.gauge("jobs_queued", lambda: job_queue.counts()[0])
+METRICS.gauge("jobs_running", lambda: job_queue.counts()[1])
 
 razorpay_key_id = os.getenv("VITE_RAZORPAY_KEY_ID")
 razorpay_key_secret = os.getenv("RAZORPAY_KEY_SECRET")
@@ -61,6 +87,24 @@ class ExportRequest(BaseModel):
     user_id: str
     export_quality: str = "1080p"
 
+class BatchExportRequest(BaseModel):
+    file_id: str
+    languages: List[str]
+    style: Dict[str, Any] = {}
+    user_id: str
+    export_quality: str = "1080p"
+
+class PreviewRequest(BaseModel):
+    file_id: str
+    time: float = 0.0
+    duration: Optional[float] = None
+    captions: List[CaptionItem] = []
+    style: Dict[str, Any] = {}
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+
 class PaymentVerifyRequest(BaseModel):
     razorpay_payment_id: str
     razorpay_order_id: str
@@ -74,58 +118,71 @@ class CreateOrderRequest(BaseModel):
     plan_type: str
     user_id: str
 
-def get_user_credits(user_id: str) -> int:
-    try:
-        response = supabase.table("user_profiles").select("credits_remaining").eq("id", user_id).single().execute()
-        if response.data:
-            return response.data.get("credits_remaining", 0)
-        return 0
-    except Exception as e:
-        print(f"Error fetching user credits: {e}")
-        return 0
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+    await export_log.start()
+    await storage.start()
+    await reservation_expiry.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    await export_log.stop()
+    await storage.stop()
+    await reservation_expiry.stop()
+    store.shutdown()
+
+def submit_job(kind, fn, *args, pins=(), **kwargs):
+    # Pinned paths are safe from storage eviction until the job finishes.
+    storage.pin(*pins)
+
+    async def run():
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            storage.unpin(*pins)
 
-def deduct_credits(user_id: str, credits_to_deduct: int) -> bool:
     try:
-        current_credits = get_user_credits(user_id)
-        if current_credits < credits_to_deduct:
-            return False
-
-        new_credits = current_credits - credits_to_deduct
-        supabase.table("user_profiles").update({"credits_remaining": new_credits}).eq("id", user_id).execute()
-        return True
-    except Exception as e:
-        print(f"Error deducting credits: {e}")
-        return False
-
-def add_credits(user_id: str, credits_to_add: int) -> bool:
+        return job_queue.submit(kind, run)
+    except QueueFullError as e:
+        storage.unpin(*pins)
+        raise HTTPException(status_code=503, detail=str(e))
+
+def find_upload(file_id: str) -> Optional[str]:
+    upload_index.touch(file_id)
+    return upload_index.path_for(file_id)
+
+def upload_source_key(file_id: str, input_path: str) -> str:
+    record = upload_index.get(file_id)
+    if record and record.get("content_hash"):
+        return record["content_hash"]
+    st = os.stat(input_path)
+    return f"{input_path}:{st.st_size}:{st.st_mtime}"
+
+async def probe_upload(input_path: str):
     try:
-        current_credits = get_user_credits(user_id)
-        new_credits = current_credits + credits_to_add
-
-        supabase.table("user_profiles").update({
-            "credits_remaining": new_credits,
-            "total_credits_purchased": supabase.table("user_profiles").select("total_credits_purchased").eq("id", user_id).single().execute().data.get("total_credits_purchased", 0) + credits_to_add
-        }).eq("id", user_id).execute()
-        return True
+        await processor._probe_media(input_path)
     except Exception as e:
-        print(f"Error adding credits: {e}")
-        return False
+        print(f"Error probing upload: {e}")
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "message": "Backend is running"}
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {"success": True, **processor.cache_stats(), "previews": preview_renderer.cache.stats(), "overlays": processor.overlay.stats(), "exports": export_cache.stats(), "credits": {**credit_ledger.stats(), "expired_reservations": reservation_expiry.expired}, "export_log": export_log.stats(), "storage": storage.stats()}
+
 @app.get("/api/user/credits/{user_id}")
 async def get_credits(user_id: str):
     try:
-        credits = get_user_credits(user_id)
-        response = supabase.table("user_profiles").select("subscription_plan").eq("id", user_id).single().execute()
-        plan = response.data.get("subscription_plan", "free") if response.data else "free"
+        profile = await store.run(credit_ledger.profile, user_id)
 
         return {
             "success": True,
-            "credits": credits,
-            "subscription_plan": plan
+            "credits": profile["credits_remaining"],
+            "subscription_plan": profile["subscription_plan"]
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -137,8 +194,13 @@ async def upload_video(file: UploadFile = File(...)):
         file_ext = file.filename.split('.')[-1]
         file_path = os.path.join(UPLOAD_DIR, f"{file_id}.{file_ext}")
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = hashlib.sha256()
+        with stage("upload"), open(file_path, "wb") as buffer:
+            for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+                buffer.write(chunk)
+                content_hash.update(chunk)
+        upload_index.add(file_id, f"{file_id}.{file_ext}", content_hash.hexdigest(), file.filename)
+        await probe_upload(file_path)
 
         return {
             "success": True,
@@ -149,97 +211,360 @@ async def upload_video(file: UploadFile = File(...)):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def upload_error(e: UploadError):
+    detail = {"error": str(e)}
+    if e.received is not None:
+        detail["received"] = e.received
+    return HTTPException(status_code=e.status_code, detail=detail)
+
+@app.post("/api/upload/sessions")
+async def create_upload_session(req: UploadSessionRequest):
+    if req.size <= 0:
+        raise HTTPException(status_code=400, detail="Upload size must be positive")
+    session = upload_manager.create(req.filename, req.size)
+    return {
+        "success": True,
+        "upload_id": session["upload_id"],
+        "file_id": session["file_id"],
+        "received": 0
+    }
+
+@app.get("/api/upload/sessions/{upload_id}")
+async def get_upload_session(upload_id: str):
+    try:
+        session = upload_manager.status(upload_id)
+    except UploadError as e:
+        raise upload_error(e)
+    return {"success": True, "received": session["received"], "size": session["size"]}
+
+@app.put("/api/upload/sessions/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request, content_range: Optional[str] = Header(None)):
+    try:
+        start, end = parse_content_range(content_range)
+        with stage("upload"):
+            session = await upload_manager.write_chunk(upload_id, start, end, request.stream())
+    except UploadError as e:
+        raise upload_error(e)
+    return {"success": True, "received": session["received"], "size": session["size"]}
+
+@app.post("/api/upload/sessions/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    try:
+        session = upload_manager.status(upload_id)
+        with stage("upload_finalize"):
+            result = await upload_manager.finalize(upload_id)
+    except UploadError as e:
+        raise upload_error(e)
+
+    record = result["record"]
+    if not result["deduplicated"]:
+        await probe_upload(record["path"])
+    processor.prepare_audio(record["path"])
+
+    return {
+        "success": True,
+        "file_id": result["file_id"],
+        "raw_url": f"/uploads/{record['file_name']}",
+        "original_filename": session["original_filename"],
+        "content_hash": record["content_hash"],
+        "deduplicated": result["deduplicated"]
+    }
+
 @app.post("/api/process")
 async def process_video(req: ProcessRequest):
-    input_path = None
-    for f in os.listdir(UPLOAD_DIR):
-        if f.startswith(req.file_id):
-            input_path = os.path.join(UPLOAD_DIR, f)
-            break
+    input_path = find_upload(req.file_id)
 
     if not input_path:
         return {"success": False, "error": "File not found"}
 
-    return await processor.generate_captions_only(input_path, target_language=req.language)
-
-@app.post("/api/export")
-async def export_video(req: ExportRequest):
-    print(f"📥 EXPORT REQUEST RECEIVED for user {req.user_id}")
-    print(f"🎨 Style Data: {req.style}")
+    job = submit_job("process", processor.generate_captions_only, input_path, target_language=req.language, pins=(input_path,))
+    return {"success": True, "job_id": job.id, "status": job.status}
 
-    is_regional_language = req.style.get("target_language", "English").lower() != "english"
-    is_hd_export = req.export_quality in ["4k"]
+def export_credits(target_language: str, export_quality: str) -> int:
+    is_regional_language = target_language.lower() != "english"
+    is_hd_export = export_quality in ["4k"]
 
     credits_needed = 1
     if is_regional_language:
         credits_needed = 1
     if is_hd_export:
         credits_needed += 1
+    return credits_needed
 
-    current_credits = get_user_credits(req.user_id)
+async def reserve_credits(user_id: str, amount: int) -> str:
+    # The id is picked here so a reserve that timed out (its RPC may still
+    # have run) can be retried, and finally cancelled, without double-charging.
+    reservation_id = str(uuid.uuid4())
+    for attempt in range(2):
+        try:
+            return await store.run(credit_ledger.reserve, user_id, amount, reservation_id)
+        except asyncio.TimeoutError:
+            print(f"Credit reservation timed out (attempt {attempt + 1})")
+    try:
+        await store.run(credit_ledger.cancel, user_id, reservation_id, amount)
+    except Exception as e:
+        # Left for reservation_expiry to refund.
+        print(f"Error cancelling credit reservation {reservation_id}: {e}")
+    raise asyncio.TimeoutError("Credit reservation timed out")
 
-    if current_credits < credits_needed:
-        raise HTTPException(
-            status_code=402,
-            detail=f"Insufficient credits. You need {credits_needed} credits but have {current_credits}. Please purchase more credits."
-        )
+def export_language(req: ExportRequest) -> str:
+    return req.style.get("target_language", "English")
 
-    input_path = None
-    for f in os.listdir(UPLOAD_DIR):
-        if f.startswith(req.file_id):
-            input_path = os.path.join(UPLOAD_DIR, f)
-            break
+async def refund_export(req: ExportRequest, reservation_id: str, target_language: str, log_values=None):
+    try:
+        await store.run(credit_ledger.refund, req.user_id, reservation_id)
+    except Exception as e:
+        print(f"Error refunding credits: {e}")
+    export_log.finished(req.file_id, req.user_id, target_language, {**(log_values or {}), "export_status": "failed"})
 
-    if not input_path:
-        raise HTTPException(status_code=404, detail="Original video not found")
+async def complete_export(req: ExportRequest, key: str, reservation_id: str, credits_needed: int, target_language: str, log_values=None):
+    try:
+        credits_remaining = await store.run(credit_ledger.commit, req.user_id, reservation_id)
+    except Exception as e:
+        print(f"Error committing credits: {e}")
+        await refund_export(req, reservation_id, target_language, log_values)
+        return {"success": False, "error": "Failed to deduct credits"}
 
-    output_filename = f"export_{req.file_id}.mp4"
-    output_path = os.path.join(EXPORT_DIR, output_filename)
+    export_log.finished(req.file_id, req.user_id, target_language, {**(log_values or {}), "export_status": "completed", "completed_at": "now()"})
 
+    return {
+        "success": True,
+        "video_url": f"/exports/{export_cache.filename(key)}",
+        "credits_used": credits_needed,
+        "credits_remaining": credits_remaining
+    }
+
+async def run_export(req: ExportRequest, input_path: str, key: str, reservation_id: str, credits_needed: int):
     captions_data = [c.dict() for c in req.captions]
 
-    try:
-        supabase.table("video_exports").insert({
-            "user_id": req.user_id,
-            "file_id": req.file_id,
-            "target_language": req.style.get("target_language", "English"),
-            "caption_count": len(captions_data),
-            "export_quality": req.export_quality,
-            "export_status": "processing",
-            "credits_used": credits_needed
-        }).execute()
-    except Exception as e:
-        print(f"Error logging export: {e}")
+    async def produce(output_path):
+        return await processor.burn_only(input_path, output_path, captions_data, req.style, file_id=req.file_id, quality=req.export_quality)
 
-    result = await processor.burn_only(input_path, output_path, captions_data, req.style)
+    result = await export_cache.get_or_create(key, produce)
 
     if not result['success']:
-        try:
-            supabase.table("video_exports").update({"export_status": "failed"}).eq("file_id", req.file_id).eq("user_id", req.user_id).execute()
-        except:
-            pass
+        await refund_export(req, reservation_id, export_language(req))
         return {"success": False, "error": result.get('error')}
 
-    success = deduct_credits(req.user_id, credits_needed)
+    return await complete_export(req, key, reservation_id, credits_needed, export_language(req))
+
+@app.post("/api/export")
+async def export_video(req: ExportRequest):
+    print(f"📥 EXPORT REQUEST RECEIVED for user {req.user_id}")
+    print(f"🎨 Style Data: {req.style}")
+
+    credits_needed = export_credits(export_language(req), req.export_quality)
 
-    if not success:
-        raise HTTPException(status_code=402, detail="Failed to deduct credits")
+    input_path = find_upload(req.file_id)
+
+    if not input_path:
+        raise HTTPException(status_code=404, detail="Original video not found")
 
     try:
-        supabase.table("video_exports").update({
-            "export_status": "completed",
-            "completed_at": "now()"
-        }).eq("file_id", req.file_id).eq("user_id", req.user_id).execute()
+        reservation_id = await reserve_credits(req.user_id, credits_needed)
+    except InsufficientCreditsError as e:
+        raise HTTPException(status_code=402, detail=str(e))
     except Exception as e:
-        print(f"Error updating export status: {e}")
+        print(f"Error reserving credits: {e}")
+        raise HTTPException(status_code=503, detail="Credit service unavailable, please retry shortly")
+
+    key = export_key(upload_source_key(req.file_id, input_path), [c.dict() for c in req.captions], req.style, req.export_quality)
+    cached = export_cache.lookup(key) is not None
+
+    # Queued before the job so its status update always follows the insert.
+    export_log.started({
+        "user_id": req.user_id,
+        "file_id": req.file_id,
+        "target_language": export_language(req),
+        "caption_count": len(req.captions),
+        "export_quality": req.export_quality,
+        "export_status": "processing",
+        "credits_used": credits_needed
+    })
+
+    if cached:
+        print(f"♻️ Export cache hit for {req.file_id}")
+        result = await complete_export(req, key, reservation_id, credits_needed, export_language(req))
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        return {**result, "status": "completed", "credits_needed": credits_needed}
+
+    try:
+        job = submit_job("export", run_export, req, input_path, key, reservation_id, credits_needed, pins=(input_path,))
+    except HTTPException:
+        await refund_export(req, reservation_id, export_language(req))
+        raise
 
     return {
         "success": True,
-        "video_url": f"/exports/{output_filename}",
-        "credits_used": credits_needed,
-        "credits_remaining": get_user_credits(req.user_id)
+        "job_id": job.id,
+        "status": job.status,
+        "credits_needed": credits_needed
+    }
+
+async def release_reservations(user_id: str, reservation_ids):
+    for reservation_id in reservation_ids:
+        try:
+            await store.run(credit_ledger.refund, user_id, reservation_id)
+        except Exception as e:
+            print(f"Error refunding credits: {e}")
+
+async def run_batch_export(req: BatchExportRequest, input_path: str, reservations: Dict[str, Any]):
+    # reservations: {language: (reservation_id, credits_needed)}
+    generated = await processor.generate_captions_multi(input_path, list(reservations))
+    if not generated["success"]:
+        await asyncio.gather(*(
+            refund_export(req, reservation_id, language) for language, (reservation_id, _) in reservations.items()
+        ))
+        return {"success": False, "error": generated.get("error")}
+
+    source_key = upload_source_key(req.file_id, input_path)
+    captions = generated["captions"]
+    keys = {
+        language: export_key(source_key, captions[language], {**req.style, "target_language": language}, req.export_quality)
+        for language in reservations
+    }
+    captions_by_key = {keys[language]: captions[language] for language in keys}
+
+    async def produce(output_paths):
+        outputs = [(path, captions_by_key[key]) for key, path in output_paths.items()]
+        result = await processor.burn_multi(input_path, outputs, req.style, quality=req.export_quality)
+        return {key: result for key in output_paths}
+
+    rendered = await export_cache.get_or_create_many(list(keys.values()), produce)
+
+    async def finish(language):
+        reservation_id, credits_needed = reservations[language]
+        result = rendered[keys[language]]
+        log_values = {"caption_count": len(captions[language])}
+        if not result["success"]:
+            await refund_export(req, reservation_id, language, log_values)
+            return {"success": False, "error": result.get("error")}
+        return await complete_export(req, keys[language], reservation_id, credits_needed, language, log_values)
+
+    results = await asyncio.gather(*(finish(language) for language in reservations))
+    outputs = {}
+    for language, result in zip(reservations, results):
+        outputs[language] = {**result, "captions": captions[language]}
+
+    return {
+        "success": any(result["success"] for result in results),
+        "outputs": outputs,
+        "credits_used": sum(result.get("credits_used", 0) for result in results)
+    }
+
+@app.post("/api/export/batch")
+async def export_batch(req: BatchExportRequest):
+    print(f"📥 BATCH EXPORT REQUEST RECEIVED for user {req.user_id}: {req.languages}")
+
+    languages = []
+    seen = set()
+    for language in req.languages:
+        language = language.strip()
+        if language and language.lower() not in seen:
+            seen.add(language.lower())
+            languages.append(language)
+    if not languages:
+        raise HTTPException(status_code=400, detail="No target languages given")
+    if len(languages) > MAX_BATCH_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_LANGUAGES} languages per batch")
+
+    input_path = find_upload(req.file_id)
+    if not input_path:
+        raise HTTPException(status_code=404, detail="Original video not found")
+
+    # One reservation per output, so each language is committed or refunded
+    # on its own.
+    credits = {language: export_credits(language, req.export_quality) for language in languages}
+    reserved = await asyncio.gather(
+        *(reserve_credits(req.user_id, credits[language]) for language in languages),
+        return_exceptions=True
+    )
+    errors = [r for r in reserved if isinstance(r, BaseException)]
+    if errors:
+        await release_reservations(req.user_id, [r for r in reserved if not isinstance(r, BaseException)])
+        if any(isinstance(e, InsufficientCreditsError) for e in errors):
+            raise HTTPException(status_code=402, detail=f"Insufficient credits: need {sum(credits.values())} for {len(languages)} outputs")
+        print(f"Error reserving credits: {errors[0]}")
+        raise HTTPException(status_code=503, detail="Credit service unavailable, please retry shortly")
+
+    reservations = {language: (reservation_id, credits[language]) for language, reservation_id in zip(languages, reserved)}
+
+    for language in languages:
+        export_log.started({
+            "user_id": req.user_id,
+            "file_id": req.file_id,
+            "target_language": language,
+            "caption_count": 0,
+            "export_quality": req.export_quality,
+            "export_status": "processing",
+            "credits_used": credits[language]
+        })
+
+    try:
+        job = submit_job("batch_export", run_batch_export, req, input_path, reservations, pins=(input_path,))
+    except HTTPException:
+        await asyncio.gather(*(
+            refund_export(req, reservation_id, language) for language, (reservation_id, _) in reservations.items()
+        ))
+        raise
+
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "languages": languages,
+        "credits_needed": sum(credits.values())
     }
 
+@app.post("/api/preview")
+async def preview_captions(req: PreviewRequest):
+    input_path = find_upload(req.file_id)
+    if not input_path:
+        raise HTTPException(status_code=404, detail="Original video not found")
+
+    storage.pin(input_path)
+    try:
+        data = await preview_renderer.render(
+            input_path,
+            upload_source_key(req.file_id, input_path),
+            [c.dict() for c in req.captions],
+            req.style,
+            req.time,
+            req.duration
+        )
+    except Exception as e:
+        print(f"Preview Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        storage.unpin(input_path)
+
+    media_type = "image/jpeg" if req.duration is None else "video/mp4"
+    return Response(content=data, media_type=media_type, headers={"Cache-Control": "private, max-age=300"})
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "stages": {k: round(v, 3) for k, v in job.stages.items()}
+    }
+
+@app.get("/api/metrics")
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/payment/create-order")
 async def create_razorpay_order(req: CreateOrderRequest):
     try:
@@ -255,9 +580,9 @@ async def create_razorpay_order(req: CreateOrderRequest):
             }
         }
 
-        order = razorpay_client.order.create(data=order_data)
+        order = await store.run(razorpay_client.order.create, data=order_data, label="payment")
 
-        supabase.table("payment_transactions").insert({
+        await store.insert_payment({
             "user_id": req.user_id,
             "razorpay_order_id": order["id"],
             "amount": req.amount,
@@ -265,7 +590,7 @@ async def create_razorpay_order(req: CreateOrderRequest):
             "status": "pending",
             "plan_type": req.plan_type,
             "credits_added": 7 if req.plan_type == "weekly" else 30
-        }).execute()
+        })
 
         return {
             "success": True,
@@ -291,37 +616,53 @@ async def verify_razorpay_payment(req: PaymentVerifyRequest):
 
         credits_to_add = 7 if req.plan_type == "weekly" else 30
 
-        add_credits(req.user_id, credits_to_add)
-
-        supabase.table("payment_transactions").update({
-            "razorpay_payment_id": req.razorpay_payment_id,
-            "razorpay_signature": req.razorpay_signature,
-            "status": "success"
-        }).eq("razorpay_order_id", req.razorpay_order_id).execute()
+        new_balance = await store.run(credit_ledger.add, req.user_id, credits_to_add)
 
         plan_name = "weekly" if req.plan_type == "weekly" else "monthly"
-        supabase.table("user_profiles").update({
-            "subscription_plan": plan_name
-        }).eq("id", req.user_id).execute()
+        await asyncio.gather(
+            store.update_payment(req.razorpay_order_id, {
+                "razorpay_payment_id": req.razorpay_payment_id,
+                "razorpay_signature": req.razorpay_signature,
+                "status": "success"
+            }),
+            store.set_subscription_plan(req.user_id, plan_name)
+        )
+        credit_ledger.invalidate(req.user_id)
 
         return {
             "success": True,
             "message": "Payment verified successfully",
             "credits_added": credits_to_add,
-            "new_balance": get_user_credits(req.user_id)
+            "new_balance": new_balance
         }
     except razorpay.errors.SignatureVerificationError:
-        supabase.table("payment_transactions").update({
-            "status": "failed"
-        }).eq("razorpay_order_id", req.razorpay_order_id).execute()
+        await store.update_payment(req.razorpay_order_id, {"status": "failed"})
 
         raise HTTPException(status_code=400, detail="Invalid payment signature")
     except Exception as e:
         print(f"Error verifying payment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
-app.mount("/exports", StaticFiles(directory=EXPORT_DIR), name="exports")
+@app.api_route("/exports/{filename}", methods=["GET", "HEAD"])
+async def download_export(filename: str, request: Request):
+    path = os.path.join(EXPORT_DIR, filename)
+    if filename != os.path.basename(filename) or filename.startswith(".") or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Export not found")
+    export_cache.touch(os.path.splitext(filename)[0])
+    return file_response(path, request.headers.get("range"), method=request.method, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    })
+
+@app.api_route("/uploads/{filename}", methods=["GET", "HEAD"])
+async def serve_upload(filename: str, request: Request):
+    # Only indexed uploads are served, never anything else in UPLOAD_DIR.
+    file_id = os.path.splitext(filename)[0]
+    record = upload_index.get(file_id)
+    path = find_upload(file_id) if record and record["file_name"] == filename else None
+    if not path:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return file_response(path, request.headers.get("range"), media_type=media_type, method=request.method)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,176 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "caption_studio"
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+HELP = {
+    "stage_seconds": ("histogram", "Time spent per pipeline stage"),
+    "job_seconds": ("histogram", "Job run time from start to finish"),
+    "jobs_total": ("counter", "Finished jobs by kind and status"),
+    "encode_fps": ("gauge", "Combined fps of the encodes running right now"),
+    "jobs_queued": ("gauge", "Jobs waiting for a worker"),
+    "jobs_running": ("gauge", "Jobs being processed"),
+}
+
+# The job a coroutine is working for. Set by the job queue's workers and
+# inherited by any task the job spawns.
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._histograms.setdefault(key, Histogram()).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, fn):
+        # fn() -> a number, read at scrape time.
+        self._gauges[name] = fn
+
+    def _header(self, lines, name, seen):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {PREFIX}_{name} {text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    def render(self):
+        lines = []
+        seen = set()
+        with self._lock:
+            histograms = sorted((k, (list(h.counts), h.sum, h.count, h.buckets)) for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            self._header(lines, name, seen)
+            for upper, n in zip(buckets, counts):
+                lines.append(f"{PREFIX}_{name}_bucket{_label_str(labels + (('le', upper),))} {n}")
+            lines.append(f"{PREFIX}_{name}_bucket{_label_str(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{PREFIX}_{name}_sum{_label_str(labels)} {total:.6f}")
+            lines.append(f"{PREFIX}_{name}_count{_label_str(labels)} {count}")
+
+        for (name, labels), value in counters:
+            self._header(lines, name, seen)
+            lines.append(f"{PREFIX}_{name}{_label_str(labels)} {value}")
+
+        for name, fn in sorted(self._gauges.items()):
+            self._header(lines, name, seen)
+            lines.append(f"{PREFIX}_{name} {fn()}")
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def stage(name):
+    # Times a block into the stage histogram and onto the current job.
+    job = current_job.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        METRICS.observe("stage_seconds", elapsed, stage=name)
+        if job is not None:
+            job.add_stage(name, elapsed)
+
+
+class EncodeProgress:
+    # Folds `ffmpeg -progress` reports from one or more concurrent encodes
+    # (segments) into the current job's progress.
+    active = set()
+
+    def __init__(self, total_seconds=0.0):
+        self.job = current_job.get()
+        self.total = total_seconds
+        self._out = {}
+        self._fps = {}
+        self._speed = {}
+
+    def set_total(self, seconds):
+        self.total = seconds
+
+    def part(self, key=0):
+        def update(fields):
+            if "out_time_us" in fields and fields["out_time_us"].lstrip("-").isdigit():
+                self._out[key] = max(0, int(fields["out_time_us"])) / 1e6
+            if fields.get("progress") == "end":
+                self._fps.pop(key, None)
+                self._speed.pop(key, None)
+            else:
+                self._fps[key] = _number(fields.get("fps"))
+                self._speed[key] = _number(fields.get("speed", "").rstrip("x"))
+            self._publish()
+        return update
+
+    @property
+    def fps(self):
+        return sum(self._fps.values())
+
+    def _publish(self):
+        if self.fps:
+            EncodeProgress.active.add(self)
+        else:
+            EncodeProgress.active.discard(self)
+        if self.job is None:
+            return
+        done = sum(self._out.values())
+        percent = min(100.0, done / self.total * 100) if self.total else 0.0
+        self.job.progress = {
+            "stage": "encode",
+            "percent": round(percent, 1),
+            "encoded_seconds": round(done, 2),
+            "total_seconds": round(self.total, 2),
+            "fps": round(self.fps, 1),
+            "speed": round(sum(self._speed.values()), 2),
+        }
+
+    def close(self):
+        EncodeProgress.active.discard(self)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+METRICS.gauge("encode_fps", lambda: round(sum(p.fps for p in list(EncodeProgress.active)), 1))
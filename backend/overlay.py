@@ -0,0 +1,130 @@
+import hashlib
+import os
+
+CAPTION_RENDER_MODE = os.getenv("CAPTION_RENDER_MODE", "ass")
+
+
+def overlay_mode_enabled(style):
+    # Pre-rendered overlays are static images, so the pop-in animation
+    # always goes through libass.
+    mode = style.get('render_mode') or CAPTION_RENDER_MODE
+    return mode == "overlay" and not style.get('has_animation', False)
+
+
+class OverlayRenderer:
+    # Pre-renders each distinct caption (text + style + size) to a transparent
+    # full-frame PNG, cached on disk by hash. A burn then composites a single
+    # image-sequence track over the video with the overlay filter instead of
+    # having libass re-shape every event.
+    def __init__(self, processor, cache_dir):
+        self.processor = processor
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        # Burns currently reading PNGs from the cache; storage eviction
+        # leaves the cache alone while this is non-zero.
+        self.in_use = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, style_line, width, height, text):
+        return hashlib.sha256(f"{width}x{height}|{style_line}|{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    async def _render(self, items, style, width, height, work_dir):
+        # One ffmpeg run for all missing captions: caption n is shown at
+        # second n of a transparent 1 fps source, and frame n is written out.
+        timed = [{"text": text, "start_time": n, "end_time": n + 1} for n, (_, text) in enumerate(items)]
+        ass_path = self.processor._create_inline_ass(timed, style, width, height)
+        try:
+            await self.processor._run([
+                "ffmpeg", "-y", "-v", "error",
+                "-f", "lavfi", "-i", f"color=c=black@0.0:s={width}x{height}:r=1:d={len(items)},format=rgba",
+                # Without alpha=1 libass only paints RGB and the PNGs stay
+                # fully transparent.
+                "-vf", f"ass={ass_path}:alpha=1",
+                "-start_number", "0",
+                os.path.join(work_dir, "cap_%06d.png")
+            ], check=True)
+        finally:
+            if os.path.exists(ass_path):
+                os.remove(ass_path)
+        for n, (key, _) in enumerate(items):
+            os.replace(os.path.join(work_dir, f"cap_{n:06d}.png"), self._path(key))
+
+    async def _blank(self, width, height):
+        path = self._path(f"blank_{width}x{height}")
+        if not os.path.exists(path):
+            tmp = f"{path}.tmp.png"
+            await self.processor._run([
+                "ffmpeg", "-y", "-v", "error",
+                "-f", "lavfi", "-i", f"color=c=black@0.0:s={width}x{height}:d=1,format=rgba",
+                "-frames:v", "1", tmp
+            ], check=True)
+            os.replace(tmp, path)
+        return path
+
+    async def build_track(self, captions, style, width, height, duration, work_dir):
+        style_line = self.processor._ass_style(style, width, height)
+        ordered = sorted(captions, key=lambda c: float(c['start_time']))
+
+        keys = []
+        missing = {}
+        for c in ordered:
+            text = self.processor._ass_text(c)
+            key = self._key(style_line, width, height, text)
+            keys.append(key)
+            if os.path.exists(self._path(key)):
+                self.hits += 1
+                os.utime(self._path(key))
+            elif key not in missing:
+                self.misses += 1
+                missing[key] = text
+
+        if missing:
+            await self._render(list(missing.items()), style, width, height, work_dir)
+        blank = await self._blank(width, height)
+
+        # Concat-demuxer image list: blank during gaps, one caption at a time.
+        # Overlapping captions are cut at the next caption's start.
+        entries = []
+        t = 0.0
+        for i, (c, key) in enumerate(zip(ordered, keys)):
+            start = max(float(c['start_time']), t)
+            end = float(c['end_time'])
+            if i + 1 < len(ordered):
+                end = min(end, float(ordered[i + 1]['start_time']))
+            if end <= start:
+                continue
+            if start > t:
+                entries.append((blank, start - t))
+            entries.append((self._path(key), end - start))
+            t = end
+        entries.append((blank, max(duration - t, 1.0)))
+
+        list_p = os.path.join(work_dir, "overlay.txt")
+        with open(list_p, "w") as f:
+            for path, length in entries:
+                f.write(f"file '{os.path.abspath(path)}'\nduration {length:.3f}\n")
+            # The concat demuxer ignores the last entry's duration unless the
+            # file is listed once more.
+            f.write(f"file '{os.path.abspath(entries[-1][0])}'\n")
+        return list_p
+
+    def files(self):
+        # (last_used, size, path) per cached PNG.
+        items = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".png") or entry.name.endswith(".tmp.png"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                items.append((st.st_mtime, st.st_size, entry.path))
+        return items
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
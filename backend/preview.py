@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from profiles import plan_render, video_filter
+from encoders import get_encoder
+
+PREVIEW_CACHE_BYTES = int(os.getenv("PREVIEW_CACHE_MB", 128)) * 1024 * 1024
+PREVIEW_CONCURRENCY = int(os.getenv("PREVIEW_CONCURRENCY", os.cpu_count() or 2))
+PREVIEW_THREADS = 2
+MAX_CLIP_SECONDS = 5.0
+FRAME_WINDOW_SECONDS = 0.04
+
+
+class PreviewCache:
+    def __init__(self, max_bytes=PREVIEW_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        data = self._entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._size += len(data) - len(self._entries.pop(key, b""))
+        self._entries[key] = data
+        while self._size > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._size -= len(old)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _window_captions(captions, start, end):
+    return [c for c in captions if float(c['end_time']) > start and float(c['start_time']) < end]
+
+
+def preview_key(source_key, style, captions, start, duration):
+    style_hash = hashlib.sha256(json.dumps(style, sort_keys=True, default=str).encode()).hexdigest()
+    window = [(float(c['start_time']), float(c['end_time']), str(c['text'])) for c in captions]
+    window_hash = hashlib.sha256(json.dumps([round(start, 3), duration, window], ensure_ascii=False).encode()).hexdigest()
+    return f"{source_key}:{style_hash}:{window_hash}"
+
+
+class PreviewRenderer:
+    # Renders a single JPEG frame (duration=None) or a short low-bitrate MP4
+    # with the export's ASS styling, seeking on the input so only the window
+    # itself is decoded.
+    def __init__(self, processor, cache=None):
+        self.processor = processor
+        self.cache = cache or PreviewCache()
+        self._semaphore = asyncio.Semaphore(PREVIEW_CONCURRENCY)
+
+    def _cmd(self, input_p, start, duration, plan, ass_path):
+        # Shift timestamps back to source time so the ASS events (and their
+        # animations) render exactly as in a full export, then reset them.
+        vf = f"setpts=PTS+{start:.3f}/TB,{video_filter(plan, ass_path)},setpts=PTS-STARTPTS"
+        cmd = ["ffmpeg", "-v", "error", "-ss", f"{start:.3f}", "-i", input_p, "-vf", vf]
+        if duration is None:
+            cmd += ["-frames:v", "1", "-q:v", "3", "-f", "image2pipe", "-c:v", "mjpeg", "pipe:1"]
+        else:
+            cmd += [
+                "-t", f"{duration:.3f}",
+                *get_encoder(plan).video_args(plan, PREVIEW_THREADS),
+                "-c:a", "aac", "-b:a", "64k",
+                "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", "pipe:1"
+            ]
+        return cmd
+
+    async def render(self, input_p, source_key, captions, style, start, duration=None):
+        start = max(0.0, float(start))
+        if duration is not None:
+            duration = min(max(float(duration), 0.1), MAX_CLIP_SECONDS)
+        end = start + (duration if duration is not None else FRAME_WINDOW_SECONDS)
+
+        window = _window_captions(captions, start, end)
+        key = preview_key(source_key, style, window, start, duration)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        async with self._semaphore:
+            width, height = await self.processor._get_video_dimensions(input_p)
+            plan = plan_render(width, height, "draft")
+            ass_path = self.processor._create_inline_ass(window, style, plan["width"], plan["height"])
+            try:
+                returncode, data, stderr = await self.processor._run(
+                    self._cmd(input_p, start, duration, plan, ass_path), decode=False
+                )
+            finally:
+                if os.path.exists(ass_path):
+                    os.remove(ass_path)
+
+        if returncode != 0 or not data:
+            raise Exception(f"Preview render failed: {stderr.decode('utf-8', errors='replace')}")
+
+        self.cache.put(key, data)
+        return data
@@ -1,146 +1,363 @@
 import os
-import subprocess
+import asyncio
 import tempfile
+import shutil
 import json
 import re
-from openai import OpenAI
+from openai import AsyncOpenAI
+from translator import BatchTranslator
+from cache import TranscriptCache, TranslationCache
+from audio import ExtractedAudio, extract_audio
+from segmented import SegmentedBurner, probe_keyframes
+from incremental import IncrementalExporter
+from chunking import CaptionChunker
+from transcription import TranscriptionPipeline, OpenAIWhisperBackend
+from profiles import DEFAULT_QUALITY, plan_render, video_filter, scale_filter
+from overlay import OverlayRenderer, overlay_mode_enabled
+from encoders import ENCODE_SLOTS, SLOT_THREADS, get_encoder, audio_args
+from metrics import stage, EncodeProgress
+from timing import CaptionTimer, detect_scenes
+
+WHISPER_MODEL = "whisper-1"
+TRANSCRIPT_CACHE_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MB", 512)) * 1024 * 1024
+PARALLEL_BURN_MIN_SECONDS = float(os.getenv("PARALLEL_BURN_MIN_SECONDS", 60))
+SCENE_DETECTION = os.getenv("SCENE_DETECTION", "1") != "0"
+AUDIO_PREPARE_SLOTS = int(os.getenv("AUDIO_PREPARE_SLOTS", 2))
 
 class VideoProcessor:
-    def __init__(self, fonts_dir):
+    def __init__(self, fonts_dir, cache_dir="backend/cache", index=None):
         self.fonts_dir = os.path.abspath(fonts_dir)
-        self.client = OpenAI()
+        self.index = index
+        self.client = AsyncOpenAI()
+        self.translator = BatchTranslator(self.client)
+        self.transcriber = TranscriptionPipeline(OpenAIWhisperBackend(self.client, WHISPER_MODEL), self._run)
+        self.chunker = CaptionChunker()
+        self.timer = CaptionTimer()
+        self.transcript_cache = TranscriptCache(os.path.join(cache_dir, "transcripts"), TRANSCRIPT_CACHE_BYTES)
+        self.translation_cache = TranslationCache(os.path.join(cache_dir, "translations.json"))
+        self.audio_dir = os.path.join(cache_dir, "audio")
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self._audio_tasks = {}
+        self.audio_slots = asyncio.Semaphore(AUDIO_PREPARE_SLOTS)
+        self.segmented = SegmentedBurner(self)
+        self.encode_slots = asyncio.Semaphore(ENCODE_SLOTS)
+        self.overlay = OverlayRenderer(self, os.path.join(cache_dir, "overlays"))
+        self.incremental = IncrementalExporter(self.segmented, os.path.join(cache_dir, "exports"))
+
+    async def _run(self, cmd, check=False, decode=True, progress=None):
+        if progress is not None:
+            return await self._run_with_progress(cmd, check, progress)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+        if decode:
+            stdout = stdout.decode("utf-8", errors="replace")
+            stderr = stderr.decode("utf-8", errors="replace")
+        if check and proc.returncode != 0:
+            message = stderr if decode else stderr.decode("utf-8", errors="replace")
+            raise Exception(f"{cmd[0]} failed: {message}")
+        return proc.returncode, stdout, stderr
+
+    async def _run_with_progress(self, cmd, check, progress):
+        # Streams `-progress pipe:1` key=value blocks to progress(fields) as
+        # ffmpeg encodes; stdout is consumed by the reports.
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stderr_task = asyncio.create_task(proc.stderr.read())
+            fields = {}
+            async for raw in proc.stdout:
+                key, _, value = raw.decode("utf-8", errors="replace").strip().partition("=")
+                fields[key] = value
+                if key == "progress":
+                    progress(fields)
+                    fields = {}
+            stderr = (await stderr_task).decode("utf-8", errors="replace")
+            await proc.wait()
+        except BaseException:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        if check and proc.returncode != 0:
+            raise Exception(f"{cmd[0]} failed: {stderr}")
+        return proc.returncode, "", stderr
+
+    async def _cached_probe(self, path, kind, probe):
+        if self.index:
+            cached = self.index.get_probe(path, kind)
+            if cached is not None:
+                return cached
+        with stage("probe"):
+            value = await probe(path)
+        if self.index:
+            self.index.set_probe(path, kind, value)
+        return value
+
+    async def _probe_media(self, path):
+        return await self._cached_probe(path, "media", self._ffprobe_media)
+
+    async def _probe_keyframes(self, path):
+        return await self._cached_probe(path, "keyframes", lambda p: probe_keyframes(self._run, p))
+
+    async def _probe_scenes(self, path):
+        return await self._cached_probe(path, "scenes", lambda p: detect_scenes(self._run, p))
+
+    async def _scenes_or_empty(self, task):
+        if task is None:
+            return []
+        try:
+            return await task
+        except Exception as e:
+            print(f"Scene detection failed, timing without shot changes: {e}")
+            return []
+
+    async def _ffprobe_media(self, path):
+        cmd = [
+            "ffprobe", "-v", "error",
+            "-show_entries", "stream=codec_type,codec_name,width,height,bit_rate:format=duration",
+            "-of", "json",
+            path
+        ]
+        _, stdout, _ = await self._run(cmd, check=True)
+        data = json.loads(stdout)
+        info = {"width": None, "height": None, "duration": 0.0, "audio_codec": None, "audio_bitrate": None}
+        for stream in data.get('streams', []):
+            if stream.get('codec_type') == 'video' and info["width"] is None:
+                info["width"] = int(stream['width'])
+                info["height"] = int(stream['height'])
+            elif stream.get('codec_type') == 'audio' and info["audio_codec"] is None:
+                info["audio_codec"] = stream.get('codec_name')
+                if str(stream.get('bit_rate', '')).isdigit():
+                    info["audio_bitrate"] = int(stream['bit_rate'])
+        try:
+            info["duration"] = float(data.get('format', {}).get('duration', 0.0))
+        except (TypeError, ValueError):
+            pass
+        return info
 
-    def _get_video_dimensions(self, video_path):
+    async def _get_video_dimensions(self, video_path):
         try:
-            cmd = [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "json",
-                video_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            width = int(data['streams'][0]['width'])
-            height = int(data['streams'][0]['height'])
-            return width, height
+            info = await self._probe_media(video_path)
+            if info["width"] is None:
+                raise Exception("no video stream")
+            return info["width"], info["height"]
         except Exception as e:
             print(f"Error getting video dimensions: {e}")
             return 1080, 1920
 
-    async def generate_captions_only(self, input_p, target_language="English"):
-        print(f"Processing: {input_p} -> Target: {target_language}")
+    async def _transcribe(self, audio, duration):
+        key = self.transcript_cache.key(audio.sha256, self.transcriber.model)
+        cached = self.transcript_cache.get(key)
+        if cached is not None:
+            print("⚡ Transcript cache hit")
+            return cached
+
+        with stage("transcribe"):
+            data = await self.transcriber.transcribe(audio, duration)
+        self.transcript_cache.put(key, data)
+        return data
+
+    async def _translate_segments(self, texts, target_language):
+        translations = self.translation_cache.get_many(texts, target_language)
+        missing = {k: v for k, v in texts.items() if k not in translations}
+        if missing:
+            with stage("translate"):
+                fresh = await self.translator.translate(missing, target_language, fallback=False)
+            self.translation_cache.put_many(((missing[k], v) for k, v in fresh.items()), target_language)
+            translations.update(fresh)
+        return translations
+
+    def cache_stats(self):
+        return {
+            "transcripts": self.transcript_cache.stats(),
+            "translations": self.translation_cache.stats()
+        }
+
+    def _prepared_audio_stem(self, input_p):
+        return os.path.join(self.audio_dir, os.path.splitext(os.path.basename(input_p))[0])
+
+    def _find_prepared_audio(self, input_p):
+        stem = self._prepared_audio_stem(input_p)
+        for ext in (".ogg", ".mp3"):
+            if os.path.exists(stem + ext):
+                return stem + ext
+        return None
+
+    async def _extract_prepared_audio(self, input_p):
+        stem = self._prepared_audio_stem(input_p)
         try:
-            audio_p = tempfile.mktemp(suffix=".mp3")
-            subprocess.run(["ffmpeg", "-y", "-i", input_p, "-vn", "-ar", "16000", "-ac", "1", audio_p], check=True)
-
-            with open(audio_p, "rb") as f:
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=f,
-                    response_format="verbose_json",
-                    timestamp_granularities=["segment", "word"]
-                )
-
-            final_captions = []
-
-            for seg in transcript.segments:
-                original_text = getattr(seg, 'text', '').strip()
-                start = getattr(seg, 'start', 0.0)
-                end = getattr(seg, 'end', 0.0)
-
-                if not original_text:
+            async with self.audio_slots:
+                info = await self._probe_media(input_p)
+                with stage("audio_extract"):
+                    audio = await extract_audio(input_p, info)
+                with audio:
+                    audio.save(stem + audio.ext)
+                    print(f"🎧 Pre-extracted audio: {audio.size} bytes in {audio.elapsed:.2f}s")
+        finally:
+            self._audio_tasks.pop(stem, None)
+
+    def _prepared_audio_done(self, task):
+        # Consumes the exception so a failed pre-extraction is logged even if
+        # no /api/process ever waits on it.
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Audio pre-extraction failed: {task.exception()}")
+
+    def prepare_audio(self, input_p):
+        # Starts audio extraction in the background as soon as an upload is
+        # finalized, so a later /api/process can skip straight to transcription.
+        stem = self._prepared_audio_stem(input_p)
+        if self._find_prepared_audio(input_p) or stem in self._audio_tasks:
+            return
+        # Bounded by audio_slots so a burst of finalized uploads can't start
+        # an unbounded number of ffmpeg processes.
+        task = asyncio.create_task(self._extract_prepared_audio(input_p))
+        task.add_done_callback(self._prepared_audio_done)
+        self._audio_tasks[stem] = task
+
+    def prepared_audio_files(self):
+        # (last_used, size, file_id, path) per pre-extracted audio file.
+        items = []
+        with os.scandir(self.audio_dir) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if ext not in (".ogg", ".mp3"):
                     continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                items.append((st.st_mtime, st.st_size, stem, entry.path))
+        return items
 
-                translated_text = original_text
-                if target_language.lower() != "english":
-                    try:
-                        system_prompt = (
-                            f"You are a professional subtitle translator specializing in {target_language}. "
-                            f"Translate the following English text to {target_language}. "
-                            "For regional Indian languages (Hindi, Tamil, Telugu, Bengali, Marathi, Punjabi, Gujarati, Kannada, Malayalam, Odia, Urdu), "
-                            "use natural, conversational language that matches the speaking style. "
-                            "Keep translations concise and subtitle-friendly (max 2 lines). "
-                            "Preserve the emotional tone and cultural context. "
-                            "Return ONLY the translated text without quotes, explanations, or meta-commentary."
-                        )
-
-                        res = self.client.chat.completions.create(
-                            model="gpt-4o",
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": original_text}
-                            ],
-                            temperature=0.3
-                        )
-                        translated_text = res.choices[0].message.content.strip()
-                        translated_text = translated_text.strip('"').strip("'")
-                    except Exception as e:
-                        print(f"GPT Translation Error: {e}")
-                        translated_text = original_text
-
-                words = translated_text.split()
-                duration = end - start
-                words_per_minute = (len(words) / duration) * 60 if duration > 0 else 0
-
-                if words_per_minute > 180 or len(words) > 5:
-                    words_per_caption = min(5, max(3, len(words) // 2))
-                elif words_per_minute < 60 and len(words) == 1:
-                    words_per_caption = 1
-                else:
-                    words_per_caption = min(3, len(words))
-
-                if len(words) <= words_per_caption:
-                    final_captions.append({
-                        "id": str(getattr(seg, 'id', len(final_captions))),
-                        "text": translated_text,
-                        "start_time": start,
-                        "end_time": end
-                    })
-                else:
-                    time_per_word = duration / len(words)
-                    for i in range(0, len(words), words_per_caption):
-                        chunk = words[i:i + words_per_caption]
-                        chunk_text = ' '.join(chunk)
-                        chunk_start = start + (i * time_per_word)
-                        chunk_end = start + ((i + len(chunk)) * time_per_word)
-
-                        final_captions.append({
-                            "id": str(len(final_captions)),
-                            "text": chunk_text,
-                            "start_time": chunk_start,
-                            "end_time": min(chunk_end, end)
-                        })
-
-            if os.path.exists(audio_p):
-                os.remove(audio_p)
-
-            return {"success": True, "captions": final_captions}
+    def discard_upload(self, input_p, file_id):
+        # Derived per-upload state, dropped when the upload itself is evicted.
+        prepared_p = self._find_prepared_audio(input_p)
+        if prepared_p:
+            os.remove(prepared_p)
+        self.incremental.discard(file_id)
+
+    async def generate_captions_only(self, input_p, target_language="English"):
+        result = await self.generate_captions_multi(input_p, [target_language])
+        if result["success"]:
+            result["captions"] = result["captions"][target_language]
+        return result
+
+    async def _captions_for(self, segments, words, target_language):
+        translations = {}
+        if target_language.lower() != "english":
+            translations = await self._translate_segments(
+                {str(i): seg["text"].strip() for i, seg in enumerate(segments)},
+                target_language
+            )
+
+        texts = [translations.get(str(i)) for i in range(len(segments))]
+        with stage("chunk"):
+            return self.chunker.chunk(segments, words, texts)
+
+    async def generate_captions_multi(self, input_p, target_languages):
+        # One probe, audio extraction and transcription shared by every
+        # language; translations run concurrently.
+        print(f"Processing: {input_p} -> Targets: {', '.join(target_languages)}")
+        scenes_task = None
+        try:
+            info = await self._probe_media(input_p)
+            # Runs alongside transcription; only needed once captions exist.
+            if SCENE_DETECTION and info["width"]:
+                scenes_task = asyncio.create_task(self._probe_scenes(input_p))
+
+            task = self._audio_tasks.get(self._prepared_audio_stem(input_p))
+            if task:
+                try:
+                    await asyncio.shield(task)
+                except Exception as e:
+                    print(f"Audio pre-extraction failed, extracting again: {e}")
+
+            prepared_p = self._find_prepared_audio(input_p)
+            if prepared_p:
+                audio = ExtractedAudio.from_file(prepared_p)
+            else:
+                with stage("audio_extract"):
+                    audio = await extract_audio(input_p, info)
+                print(f"🎧 Extracted audio: {audio.size} bytes in {audio.elapsed:.2f}s (copy={audio.copied})")
+
+            with audio:
+                transcript = await self._transcribe(audio, info["duration"])
+
+            segments = [seg for seg in transcript["segments"] if seg["text"].strip()]
+            per_language = await asyncio.gather(
+                *(self._captions_for(segments, transcript["words"], language) for language in target_languages)
+            )
+
+            scenes = await self._scenes_or_empty(scenes_task)
+            captions = {}
+            with stage("timing"):
+                for language, chunked in zip(target_languages, per_language):
+                    captions[language] = self.timer.optimise(chunked, scenes, info["duration"])
+
+            return {"success": True, "captions": captions, "stats": audio.stats()}
 
         except Exception as e:
+            if scenes_task is not None and not scenes_task.done():
+                scenes_task.cancel()
             print(f"Generation Error: {e}")
             return {"success": False, "error": str(e)}
 
-    async def burn_only(self, input_p, output_p, captions, style):
+    async def burn_only(self, input_p, output_p, captions, style, file_id=None, quality=DEFAULT_QUALITY):
+        async with self.encode_slots:
+            with stage("encode"):
+                return await self._burn(input_p, output_p, captions, style, file_id, quality)
+
+    async def _burn(self, input_p, output_p, captions, style, file_id, quality):
         print(f"🎨 BURNING STYLES: {style}")
+        progress = None
         try:
-            width, height = self._get_video_dimensions(input_p)
+            src_width, src_height = await self._get_video_dimensions(input_p)
+            plan = plan_render(src_width, src_height, quality)
+            width, height = plan["width"], plan["height"]
+            info = await self._probe_media(input_p)
+            progress = EncodeProgress(info["duration"])
+
+            # Overlay mode is for caption-dense videos, which are usually the
+            # long ones, so it takes precedence over segmented burning.
+            if overlay_mode_enabled(style):
+                return await self._burn_overlay(input_p, output_p, captions, style, plan, info, progress)
+
+            if (file_id or self.segmented.workers > 1) and info["duration"] >= PARALLEL_BURN_MIN_SECONDS:
+                try:
+                    if file_id:
+                        done = await self.incremental.export(file_id, input_p, output_p, captions, style, plan, info, progress=progress)
+                    else:
+                        done = await self.segmented.burn(input_p, output_p, captions, style, plan, info, progress=progress)
+                    if done:
+                        return {"success": True}
+                except Exception as e:
+                    print(f"Segmented burn failed, falling back to single pass: {e}")
+
             ass_path = self._create_inline_ass(captions, style, width, height)
+            encoder = get_encoder(plan)
 
             cmd = [
                 "ffmpeg", "-y", "-i", input_p,
-                "-vf", f"ass={ass_path}",
-                "-c:v", "libx264", "-preset", "medium", "-crf", "18",
-                "-c:a", "aac", "-b:a", "192k",
+                "-vf", video_filter(plan, ass_path),
+                *encoder.video_args(plan, SLOT_THREADS),
+                *audio_args(plan, info["audio_codec"]),
                 output_p
             ]
 
-            print(f"🚀 Running FFmpeg with dimensions {width}x{height}...")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            print(f"🚀 Running FFmpeg ({encoder.name}, {SLOT_THREADS} threads) at {width}x{height} ({plan['quality']}, source {src_width}x{src_height})...")
+            returncode, _, stderr = await self._run(cmd, progress=progress.part())
 
-            if result.returncode != 0:
-                print(f"FFmpeg stderr: {result.stderr}")
-                raise Exception(f"FFmpeg failed: {result.stderr}")
+            if returncode != 0:
+                print(f"FFmpeg stderr: {stderr}")
+                raise Exception(f"FFmpeg failed: {stderr}")
 
             if os.path.exists(ass_path):
                 os.remove(ass_path)
@@ -150,6 +367,94 @@ class VideoProcessor:
         except Exception as e:
             print(f"Export Error: {e}")
             return {"success": False, "error": str(e)}
+        finally:
+            if progress is not None:
+                progress.close()
+
+    async def _burn_overlay(self, input_p, output_p, captions, style, plan, info, progress):
+        work_dir = tempfile.mkdtemp(prefix="overlay_")
+        self.overlay.in_use += 1
+        try:
+            track = await self.overlay.build_track(captions, style, plan["width"], plan["height"], info["duration"], work_dir)
+            base = scale_filter(plan) or "null"
+            encoder = get_encoder(plan)
+            cmd = [
+                "ffmpeg", "-y", "-i", input_p,
+                "-f", "concat", "-safe", "0", "-i", track,
+                "-filter_complex", f"[0:v]{base}[base];[base][1:v]overlay=eof_action=pass:format=auto[v]",
+                "-map", "[v]", "-map", "0:a?",
+                *encoder.video_args(plan, SLOT_THREADS),
+                *audio_args(plan, info["audio_codec"]),
+                output_p
+            ]
+            print(f"🚀 Running FFmpeg overlay burn ({encoder.name}) at {plan['width']}x{plan['height']}...")
+            await self._run(cmd, check=True, progress=progress.part())
+            return {"success": True}
+        finally:
+            self.overlay.in_use -= 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def burn_multi(self, input_p, outputs, style, quality=DEFAULT_QUALITY):
+        # outputs: [(output_p, captions), ...], all with the same style.
+        async with self.encode_slots:
+            with stage("encode"):
+                if len(outputs) == 1 or overlay_mode_enabled(style):
+                    for output_p, captions in outputs:
+                        result = await self._burn(input_p, output_p, captions, style, None, quality)
+                        if not result["success"]:
+                            return result
+                    return {"success": True}
+                return await self._burn_split(input_p, outputs, style, quality)
+
+    async def _burn_split(self, input_p, outputs, style, quality):
+        # One ffmpeg decodes and scales the input once, then split hands the
+        # frames to one subtitle branch and encoder per output. The outputs
+        # share this job's encode slot, so they share its threads too.
+        ass_paths = []
+        progress = None
+        try:
+            src_width, src_height = await self._get_video_dimensions(input_p)
+            plan = plan_render(src_width, src_height, quality)
+            width, height = plan["width"], plan["height"]
+            info = await self._probe_media(input_p)
+            progress = EncodeProgress(info["duration"])
+            encoder = get_encoder(plan)
+            threads = max(1, SLOT_THREADS // len(outputs))
+
+            branches = "".join(f"[s{i}]" for i in range(len(outputs)))
+            graph = [f"[0:v]{scale_filter(plan) or 'null'},split={len(outputs)}{branches}"]
+            output_args = []
+            for i, (output_p, captions) in enumerate(outputs):
+                ass_path = self._create_inline_ass(captions, style, width, height)
+                ass_paths.append(ass_path)
+                graph.append(f"[s{i}]ass={ass_path}[v{i}]")
+                output_args += [
+                    "-map", f"[v{i}]", "-map", "0:a?",
+                    *encoder.video_args(plan, threads),
+                    *audio_args(plan, info["audio_codec"]),
+                    output_p
+                ]
+
+            cmd = ["ffmpeg", "-y", "-i", input_p, "-filter_complex", ";".join(graph), *output_args]
+
+            print(f"🚀 Running FFmpeg split burn: {len(outputs)} outputs ({encoder.name}, {threads} threads each) at {width}x{height} ({plan['quality']})...")
+            returncode, _, stderr = await self._run(cmd, progress=progress.part())
+
+            if returncode != 0:
+                print(f"FFmpeg stderr: {stderr}")
+                raise Exception(f"FFmpeg failed: {stderr}")
+
+            return {"success": True}
+
+        except Exception as e:
+            print(f"Export Error: {e}")
+            return {"success": False, "error": str(e)}
+        finally:
+            for ass_path in ass_paths:
+                if os.path.exists(ass_path):
+                    os.remove(ass_path)
+            if progress is not None:
+                progress.close()
 
     def _hex_to_ass(self, hex_c, alpha=1.0):
         if not hex_c:
@@ -165,9 +470,9 @@ class VideoProcessor:
         h, m, sec = int(s // 3600), int((s % 3600) // 60), s % 60
         return f"{h}:{m:02d}:{sec:05.2f}"
 
-    def _create_inline_ass(self, captions, style, width, height):
-        ass_path = tempfile.mktemp(suffix=".ass")
-
+    def _ass_style(self, style, width, height):
+        # Everything shared by all captions goes into one named [V4+ Styles]
+        # entry, so libass parses and shapes it once instead of per event.
         font_family = style.get('font_family', 'Arial')
         base_font_size = int(style.get('font_size', 24))
 
@@ -183,27 +488,40 @@ class VideoProcessor:
 
         pos_y = float(style.get('position_y', 15))
         y_position = int(height * (1 - pos_y / 100))
-
-        x_center = width // 2
+        # Bottom-centre alignment with MarginV puts the bottom of the text
+        # exactly where the old per-line \pos(width/2, y_position) did.
+        margin_v = max(0, height - y_position)
 
         if has_bg:
-            border_style = "4"
-            border = "8"
-            shadow = "0"
+            fontname = "Arial"
+            border_style, border, shadow = "4", "8", "0"
+            outline_color = bg_color
             back_color = bg_color
-            style_tags = f"\\fnArial\\fs{font_size}\\1c{text_color}\\3c{bg_color}\\4c{bg_color}\\bord{border}\\shad{shadow}"
         else:
-            border_style = "1"
-            border = "3"
-            shadow = "2"
+            fontname = font_family
+            border_style, border, shadow = "1", "3", "2"
             outline_color = "&H80000000"
             back_color = "&H80000000"
-            style_tags = f"\\fn{font_family}\\fs{font_size}\\1c{text_color}\\3c{outline_color}\\4c{back_color}\\bord{border}\\shad{shadow}"
 
+        return (
+            f"Style: Caption,{fontname},{font_size},{text_color},&H000000FF,{outline_color},{back_color},"
+            f"0,0,0,0,100,100,0,0,{border_style},{border},{shadow},2,10,10,{margin_v},1"
+        )
+
+    def _ass_text(self, caption):
+        text = str(caption['text']).replace('\n', ' ').replace('|', ' ')
+        return text.replace('{', '').replace('}', '')
+
+    def _create_inline_ass(self, captions, style, width, height):
+        ass_path = tempfile.mktemp(suffix=".ass")
+
+        style_line = self._ass_style(style, width, height)
+        # Only the per-event pop-in animation still needs override tags.
+        tags = ""
         if style.get('has_animation', False):
-            style_tags += r"\t(0,150,\fscx110\fscy110)\t(150,300,\fscx100\fscy100)"
+            tags = r"{\t(0,150,\fscx110\fscy110)\t(150,300,\fscx100\fscy100)}"
 
-        with open(ass_path, "w", encoding="utf-8") as f:
+        with stage("ass"), open(ass_path, "w", encoding="utf-8") as f:
             f.write(f"""[Script Info]
 ScriptType: v4.00+
 PlayResX: {width}
@@ -212,7 +530,7 @@ WrapStyle: 0
 
 [V4+ Styles]
 Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,{font_family},{font_size},{text_color},&H000000FF,{outline_color},{back_color},0,0,0,0,100,100,0,0,{border_style},{border},{shadow},2,10,10,20,1
+{style_line}
 
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
@@ -220,12 +538,8 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
             for c in captions:
                 start = self._fmt(float(c['start_time']))
                 end = self._fmt(float(c['end_time']))
-                text = str(c['text']).replace('\n', ' ').replace('|', ' ')
-
-                text = text.replace('{', '').replace('}', '')
-
-                line = f"Dialogue: 0,{start},{end},Default,,0,0,0,,{{{style_tags}\\pos({x_center},{y_position})}}{text}\n"
-                f.write(line)
+                event_tags = tags if c.get("animate", True) else ""
+                f.write(f"Dialogue: 0,{start},{end},Caption,,0,0,0,,{event_tags}{self._ass_text(c)}\n")
 
         print(f"✅ ASS file created at {ass_path}")
         return ass_path
@@ -0,0 +1,47 @@
+# Export quality tiers. "short_side" caps the smaller of width/height so that
+# portrait and landscape uploads both land on the expected tier; sources are
+# never upscaled.
+EXPORT_PROFILES = {
+    "draft": {"short_side": 360, "encoder": "x264-draft", "preset": "ultrafast", "crf": 30, "audio_bitrate": "96k", "scaler": "fast_bilinear"},
+    "720p": {"short_side": 720, "encoder": "x264", "preset": "veryfast", "crf": 21, "audio_bitrate": "128k", "scaler": "bicubic"},
+    "1080p": {"short_side": 1080, "encoder": "x264", "preset": "medium", "crf": 18, "audio_bitrate": "192k", "scaler": "lanczos"},
+    "4k": {"short_side": 2160, "encoder": "x264", "preset": "medium", "crf": 18, "audio_bitrate": "192k", "scaler": "lanczos"},
+}
+DEFAULT_QUALITY = "1080p"
+
+
+def _even(v):
+    return max(2, int(round(v / 2)) * 2)
+
+
+def plan_render(src_width, src_height, quality=DEFAULT_QUALITY):
+    name = quality if quality in EXPORT_PROFILES else DEFAULT_QUALITY
+    profile = EXPORT_PROFILES[name]
+
+    width, height = src_width, src_height
+    short_side = min(src_width, src_height)
+    if short_side > profile["short_side"]:
+        ratio = profile["short_side"] / short_side
+        width, height = _even(src_width * ratio), _even(src_height * ratio)
+
+    return {
+        "quality": name,
+        "src_width": src_width,
+        "src_height": src_height,
+        "width": width,
+        "height": height,
+        **profile
+    }
+
+
+def scale_filter(plan):
+    if (plan["width"], plan["height"]) == (plan["src_width"], plan["src_height"]):
+        return None
+    return f"scale={plan['width']}:{plan['height']}:flags={plan['scaler']}"
+
+
+def video_filter(plan, ass_path):
+    # Scale first so libass renders at the output resolution.
+    filters = [f for f in (scale_filter(plan), f"ass={ass_path}") if f]
+    return ",".join(filters)
+
@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import csv
+import os
+import shutil
+import tempfile
+
+from profiles import video_filter
+from encoders import SLOT_THREADS, get_encoder, audio_args
+
+# Segments burned at once within one encode slot; each gets an equal share
+# of the slot's threads.
+PARALLEL_BURN_WORKERS = int(os.getenv("PARALLEL_BURN_WORKERS", max(1, SLOT_THREADS // 2)))
+MIN_SEGMENT_SECONDS = float(os.getenv("MIN_SEGMENT_SECONDS", 10))
+# Matches the \t animation window written by _create_inline_ass.
+ANIMATION_SECONDS = 0.3
+
+
+async def probe_keyframes(run, path):
+    # Reads packet flags only, so this never decodes a frame.
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        path
+    ]
+    _, stdout, _ = await run(cmd, check=True)
+    keyframes = []
+    for line in stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+            keyframes.append(float(parts[0]))
+    return sorted(set(keyframes))
+
+
+def plan_cuts(keyframes, duration, count, captions=(), avoid_animation=False):
+    # Picks up to count-1 keyframes close to evenly spaced targets. With
+    # animated captions, cuts inside a caption's pop-in are skipped so the
+    # animation is not replayed at the start of the next segment.
+    if count < 2 or duration <= 0:
+        return []
+
+    candidates = [k for k in keyframes if MIN_SEGMENT_SECONDS <= k <= duration - MIN_SEGMENT_SECONDS]
+    if avoid_animation and captions:
+        starts = sorted(float(c['start_time']) for c in captions)
+        safe = []
+        for k in candidates:
+            i = bisect.bisect_left(starts, k)
+            if i > 0 and k - starts[i - 1] < ANIMATION_SECONDS:
+                continue
+            safe.append(k)
+        candidates = safe
+    if not candidates:
+        return []
+
+    cuts = []
+    last = 0.0
+    for n in range(1, count):
+        target = duration * n / count
+        i = bisect.bisect_left(candidates, target)
+        best = min(candidates[max(0, i - 1):i + 1], key=lambda k: abs(k - target))
+        if best - last >= MIN_SEGMENT_SECONDS and (not cuts or best > cuts[-1]):
+            cuts.append(best)
+            last = best
+    return cuts
+
+
+def slice_captions(captions, start, end):
+    out = []
+    for c in captions:
+        c_start = float(c['start_time'])
+        c_end = float(c['end_time'])
+        if c_end <= start or c_start >= end:
+            continue
+        piece = {
+            **c,
+            "start_time": max(c_start, start) - start,
+            "end_time": min(c_end, end) - start
+        }
+        if c_start < start:
+            # The continuation of a caption cut by a segment boundary; its
+            # pop-in already played in the previous segment.
+            piece["animate"] = False
+        out.append(piece)
+    return out
+
+
+class SegmentedBurner:
+    # Splits the video stream at keyframes (stream copy), burns each GOP-aligned
+    # segment in its own ffmpeg process, then joins them with the concat demuxer
+    # and muxes the original audio back in once.
+    def __init__(self, processor, workers=PARALLEL_BURN_WORKERS):
+        self.processor = processor
+        self.workers = max(1, workers)
+
+    async def split(self, input_p, cuts, work_dir):
+        list_p = os.path.join(work_dir, "segments.csv")
+        cmd = ["ffmpeg", "-y", "-i", input_p, "-map", "0:v:0", "-c", "copy", "-f", "segment"]
+        if cuts:
+            # The segment muxer cuts at the first keyframe at or after each
+            # time, so nudge down to stay on the probed keyframe.
+            cmd += ["-segment_times", ",".join(f"{max(0.0, t - 0.0005):.6f}" for t in cuts)]
+        cmd += [
+            "-reset_timestamps", "1",
+            "-segment_list", list_p, "-segment_list_type", "csv",
+            os.path.join(work_dir, "seg_%04d.mkv")
+        ]
+        await self.processor._run(cmd, check=True)
+
+        with open(list_p, newline="") as f:
+            rows = list(csv.reader(f))
+        # The list's times are packet times shifted by the source's B-frame
+        # delay; captions are timed against frame pts, so segments start at
+        # the probed keyframes themselves.
+        starts = [0.0, *cuts]
+        if len(rows) != len(starts):
+            raise Exception(f"Expected {len(starts)} segments, segment muxer wrote {len(rows)}")
+        segments = []
+        for i, (name, listed_start, listed_end) in enumerate(rows):
+            if i + 1 < len(starts):
+                end = starts[i + 1]
+            else:
+                end = float(listed_end) - float(listed_start) + starts[i]
+            segments.append({
+                "path": os.path.join(work_dir, name),
+                "start": starts[i],
+                "end": end
+            })
+        return segments
+
+    def encode_cmd(self, segment_p, ass_path, output_p, threads, plan):
+        return [
+            "ffmpeg", "-y", "-i", segment_p,
+            "-vf", video_filter(plan, ass_path),
+            *get_encoder(plan).video_args(plan, threads),
+            "-an", output_p
+        ]
+
+    async def encode_segments(self, segments, captions, style, plan, work_dir, only=None, progress=None):
+        # Encoded files are named by segment index, so re-encoding a subset
+        # (incremental export) replaces exactly those files in place.
+        semaphore = asyncio.Semaphore(self.workers)
+        threads = max(1, SLOT_THREADS // self.workers)
+        if progress is not None:
+            progress.set_total(sum(seg["end"] - seg["start"] for i, seg in enumerate(segments) if only is None or i in only))
+
+        async def encode(i, seg):
+            out_p = os.path.join(work_dir, f"enc_{i:04d}.mp4")
+            if only is not None and i not in only:
+                return out_p
+            async with semaphore:
+                ass_path = self.processor._create_inline_ass(
+                    slice_captions(captions, seg["start"], seg["end"]), style, plan["width"], plan["height"]
+                )
+                tmp_p = os.path.join(work_dir, f"enc_{i:04d}.tmp.mp4")
+                try:
+                    await self.processor._run(
+                        self.encode_cmd(seg["path"], ass_path, tmp_p, threads, plan), check=True,
+                        progress=progress.part(i) if progress is not None else None
+                    )
+                    os.replace(tmp_p, out_p)
+                finally:
+                    for p in (ass_path, tmp_p):
+                        if os.path.exists(p):
+                            os.remove(p)
+                return out_p
+
+        return await asyncio.gather(*(encode(i, seg) for i, seg in enumerate(segments)))
+
+    async def concat(self, encoded, input_p, output_p, audio_codec, plan, work_dir):
+        list_p = os.path.join(work_dir, "concat.txt")
+        with open(list_p, "w") as f:
+            for p in encoded:
+                f.write(f"file '{os.path.abspath(p)}'\n")
+
+        cmd = [
+            "ffmpeg", "-y",
+            "-f", "concat", "-safe", "0", "-i", list_p,
+            "-i", input_p,
+            "-map", "0:v:0", "-map", "1:a:0?",
+            "-c:v", "copy", *audio_args(plan, audio_codec),
+            "-movflags", "+faststart",
+            output_p
+        ]
+        await self.processor._run(cmd, check=True)
+
+    async def plan_and_split(self, input_p, captions, style, info, work_dir, count=None):
+        keyframes = await self.processor._probe_keyframes(input_p)
+        cuts = plan_cuts(
+            keyframes, info["duration"], count or self.workers,
+            captions, avoid_animation=style.get('has_animation', False)
+        )
+        if not cuts:
+            return None
+        return await self.split(input_p, cuts, work_dir)
+
+    async def burn(self, input_p, output_p, captions, style, plan, info, progress=None):
+        work_dir = tempfile.mkdtemp(prefix="burn_")
+        try:
+            segments = await self.plan_and_split(input_p, captions, style, info, work_dir)
+            if not segments:
+                return False
+
+            print(f"🧩 Burning {len(segments)} segments across {self.workers} workers")
+            encoded = await self.encode_segments(segments, captions, style, plan, work_dir, progress=progress)
+            await self.concat(encoded, input_p, output_p, info.get("audio_codec"), plan, work_dir)
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
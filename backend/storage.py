@@ -0,0 +1,185 @@
+import asyncio
+import os
+import time
+
+STORAGE_MAX_BYTES = int(float(os.getenv("STORAGE_MAX_GB", 50)) * 1024 * 1024 * 1024)
+# Artifacts untouched for this long are removed even under budget; 0 disables.
+STORAGE_TTL_SECONDS = float(os.getenv("STORAGE_TTL_HOURS", 72)) * 3600
+STORAGE_SWEEP_SECONDS = float(os.getenv("STORAGE_SWEEP_SECONDS", 300))
+# Incremental export state (a source copy plus encoded segments per file_id)
+# gets its own share of the budget so it can't crowd out uploads.
+STORAGE_INCREMENTAL_MAX_BYTES = int(float(os.getenv("STORAGE_INCREMENTAL_MAX_GB", 10)) * 1024 * 1024 * 1024)
+
+
+class StorageManager:
+    # Keeps everything on disk under a budget: uploads and rendered exports,
+    # plus the state derived from uploads (incremental export segments,
+    # pre-extracted audio, overlay PNGs) and in-progress chunked uploads.
+    # A periodic sweep drops anything idle past the TTL, then evicts least
+    # recently used artifacts until the total fits, derived state first since
+    # it can be rebuilt. Paths pinned by queued or running jobs, and state
+    # in use by them, are never evicted.
+    def __init__(self, index, export_cache, processor, partial_dir=None, max_bytes=STORAGE_MAX_BYTES, incremental_max_bytes=STORAGE_INCREMENTAL_MAX_BYTES, ttl=STORAGE_TTL_SECONDS, interval=STORAGE_SWEEP_SECONDS):
+        self.index = index
+        self.export_cache = export_cache
+        self.processor = processor
+        self.partial_dir = partial_dir
+        self.max_bytes = max_bytes
+        self.incremental_max_bytes = incremental_max_bytes
+        self.ttl = ttl
+        self.interval = interval
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.last_total = 0
+        self._pins = {}
+        self._task = None
+
+    def pin(self, *paths):
+        for p in paths:
+            key = os.path.abspath(p)
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, *paths):
+        for p in paths:
+            key = os.path.abspath(p)
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def pinned(self, path):
+        return os.path.abspath(path) in self._pins
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.index.flush, True)
+
+    async def _loop(self):
+        while True:
+            try:
+                # Walks several cache trees and deletes files: off the loop.
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Storage sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _artifacts(self):
+        # (tier, last_access, size, kind, id, path); tier 0 is derived state
+        # that is evicted before the tier 1 uploads and exports.
+        items = []
+        for last_used, size, file_id in self.processor.incremental.states():
+            items.append((0, last_used, size, "incremental", file_id, os.path.join(self.processor.incremental.state_dir, file_id)))
+        for last_used, size, file_id, path in self.processor.prepared_audio_files():
+            items.append((0, last_used, size, "audio", file_id, path))
+        for last_used, size, path in self.processor.overlay.files():
+            items.append((0, last_used, size, "overlay", os.path.basename(path), path))
+
+        for file_id in list(self.index.records):
+            path = self.index.path_for(file_id)
+            if not path:
+                continue
+            try:
+                items.append((1, self.index.last_access(file_id), os.path.getsize(path), "upload", file_id, path))
+            except (OSError, KeyError):
+                continue
+        for key, path, size in self.export_cache.artifacts():
+            try:
+                items.append((1, os.stat(path).st_mtime, size, "export", key, path))
+            except OSError:
+                continue
+        # Anything else in the exports dir, e.g. pre-cache export_{file_id}.mp4.
+        known = {os.path.abspath(item[5]) for item in items}
+        with os.scandir(self.export_cache.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or os.path.abspath(entry.path) in known:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                items.append((1, st.st_mtime, st.st_size, "file", entry.name, entry.path))
+
+        # Counted but never evicted here; UploadManager expires sessions.
+        if self.partial_dir and os.path.isdir(self.partial_dir):
+            with os.scandir(self.partial_dir) as entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    items.append((2, st.st_mtime, st.st_size, "partial", entry.name, entry.path))
+        return items
+
+    def _in_use(self, kind, item_id, path):
+        if kind == "partial":
+            return True
+        if kind == "overlay":
+            return self.processor.overlay.in_use > 0
+        if kind in ("incremental", "audio"):
+            upload = self.index.path_for(item_id)
+            if upload and self.pinned(upload):
+                return True
+            return kind == "incremental" and self.processor.incremental.busy(item_id)
+        return self.pinned(path)
+
+    def _evict(self, kind, item_id, path):
+        if kind == "upload":
+            self.index.remove(item_id)
+            self.processor.discard_upload(path, item_id)
+        elif kind == "export":
+            self.export_cache.discard(item_id)
+            return
+        elif kind == "incremental":
+            self.processor.incremental.discard(item_id)
+            return
+        if os.path.exists(path):
+            os.remove(path)
+
+    def sweep(self):
+        self.index.flush()
+        items = sorted(self._artifacts())
+        total = sum(item[2] for item in items)
+        incremental = sum(item[2] for item in items if item[3] == "incremental")
+        cutoff = time.time() - self.ttl if self.ttl else None
+
+        for _, last_access, size, kind, item_id, path in items:
+            expired = cutoff is not None and last_access < cutoff
+            over = total > self.max_bytes or (kind == "incremental" and incremental > self.incremental_max_bytes)
+            if not expired and not over:
+                continue
+            if self._in_use(kind, item_id, path):
+                continue
+            try:
+                self._evict(kind, item_id, path)
+            except OSError as e:
+                print(f"Could not evict {path}: {e}")
+                continue
+            total -= size
+            if kind == "incremental":
+                incremental -= size
+            self.evictions += 1
+            self.evicted_bytes += size
+            print(f"🧹 Evicted {kind} {item_id} ({size} bytes, {'expired' if expired else 'over budget'})")
+
+        self.last_total = total
+        return total
+
+    def stats(self):
+        return {
+            "bytes": self.last_total,
+            "max_bytes": self.max_bytes,
+            "incremental_max_bytes": self.incremental_max_bytes,
+            "ttl_seconds": self.ttl,
+            "pinned": len(self._pins),
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+        }
@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import stage
+
+DB_WORKERS = int(os.getenv("DB_WORKERS", 16))
+DB_TIMEOUT_SECONDS = float(os.getenv("DB_TIMEOUT_SECONDS", 10))
+EXPORT_LOG_INTERVAL = float(os.getenv("EXPORT_LOG_INTERVAL", 1.0))
+EXPORT_LOG_BATCH = 100
+
+
+class Store:
+    # supabase-py and razorpay are blocking clients, so every call runs on a
+    # bounded thread pool with a per-call timeout instead of on the event loop.
+    def __init__(self, client, workers=DB_WORKERS, timeout=DB_TIMEOUT_SECONDS):
+        self.client = client
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="store")
+
+    async def run(self, fn, *args, timeout=None, label="db", **kwargs):
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        with stage(label):
+            return await asyncio.wait_for(call, timeout or self.timeout)
+
+    async def _execute(self, query):
+        return (await self.run(query.execute)).data
+
+    async def set_subscription_plan(self, user_id, plan):
+        return await self._execute(self.client.table("user_profiles").update({"subscription_plan": plan}).eq("id", user_id))
+
+    async def insert_payment(self, row):
+        return await self._execute(self.client.table("payment_transactions").insert(row))
+
+    async def update_payment(self, order_id, values):
+        return await self._execute(self.client.table("payment_transactions").update(values).eq("razorpay_order_id", order_id))
+
+    async def insert_exports(self, rows):
+        return await self._execute(self.client.table("video_exports").insert(rows))
+
+    async def update_export(self, file_id, user_id, target_language, values):
+        query = self.client.table("video_exports").update(values)
+        return await self._execute(query.eq("file_id", file_id).eq("user_id", user_id).eq("target_language", target_language))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class ExportLog:
+    # Fire-and-forget video_exports bookkeeping. Rows are queued on the
+    # request path and written in batches: all new rows in one insert, and a
+    # status change for a row still in the same batch is folded into that
+    # insert instead of becoming a separate update. Rows are keyed by
+    # (file_id, user_id, target_language), so each output of a batch export
+    # keeps its own status.
+    def __init__(self, store, interval=EXPORT_LOG_INTERVAL, max_batch=EXPORT_LOG_BATCH):
+        self.store = store
+        self.interval = interval
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self.failures = 0
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        pending = []
+        while self._queue and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            await self._flush(pending)
+
+    def started(self, row):
+        self._queue.put_nowait(("insert", (row["file_id"], row["user_id"], row["target_language"]), row))
+
+    def finished(self, file_id, user_id, target_language, values):
+        self._queue.put_nowait(("update", (file_id, user_id, target_language), values))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        inserts = []
+        latest = {}
+        updates = {}
+        for op, key, values in batch:
+            if op == "insert":
+                row = dict(values)
+                inserts.append(row)
+                latest.setdefault(key, []).append(row)
+            elif key in latest:
+                # Like the UPDATE it replaces, this applies to every row
+                # with the key.
+                for row in latest[key]:
+                    row.update(values)
+            else:
+                updates.setdefault(key, {}).update(values)
+
+        self.batches += 1
+        try:
+            if inserts:
+                await self.store.insert_exports(inserts)
+                self.writes += 1
+            for (file_id, user_id, target_language), values in updates.items():
+                await self.store.update_export(file_id, user_id, target_language, values)
+                self.writes += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"Error writing export log: {e}")
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "writes": self.writes,
+            "failures": self.failures,
+        }
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeSupabase
+from credits import CreditLedger, InsufficientCreditsError, ReservationSettledError
+
+
+@pytest.fixture
+def db():
+    return FakeSupabase({"user": 5})
+
+
+@pytest.fixture
+def ledger(db):
+    return CreditLedger(db)
+
+
+def balance(db):
+    return db._profile("user")["credits_remaining"]
+
+
+def test_reserve_takes_credits_up_front(db, ledger):
+    reservation_id = ledger.reserve("user", 2)
+    assert reservation_id
+    assert balance(db) == 3
+
+
+def test_reserve_is_idempotent_for_the_same_id(db, ledger):
+    assert ledger.reserve("user", 2, "r1") == "r1"
+    assert ledger.reserve("user", 2, "r1") == "r1"
+    assert balance(db) == 3
+
+
+def test_reserve_rejects_insufficient_credits(db, ledger):
+    with pytest.raises(InsufficientCreditsError) as e:
+        ledger.reserve("user", 6)
+    assert e.value.available == 5
+    assert balance(db) == 5
+
+
+def test_commit_keeps_credits_spent(db, ledger):
+    reservation_id = ledger.reserve("user", 2)
+    assert ledger.commit("user", reservation_id) == 3
+    assert ledger.refund("user", reservation_id) == 3
+    assert balance(db) == 3
+
+
+def test_refund_returns_credits_once(db, ledger):
+    reservation_id = ledger.reserve("user", 2)
+    assert ledger.refund("user", reservation_id) == 5
+    assert ledger.refund("user", reservation_id) == 5
+    assert balance(db) == 5
+
+
+def test_commit_after_refund_raises(db, ledger):
+    reservation_id = ledger.reserve("user", 2)
+    ledger.refund("user", reservation_id)
+    with pytest.raises(ReservationSettledError):
+        ledger.commit("user", reservation_id)
+    assert balance(db) == 5
+
+
+def test_cancel_before_reserve_blocks_late_reserve(db, ledger):
+    ledger.cancel("user", "r1", 2)
+    with pytest.raises(InsufficientCreditsError):
+        ledger.reserve("user", 2, "r1")
+    assert balance(db) == 5
+
+
+def test_expire_refunds_only_old_open_reservations(db, ledger):
+    old = ledger.reserve("user", 1)
+    committed = ledger.reserve("user", 1)
+    ledger.commit("user", committed)
+    fresh = ledger.reserve("user", 1)
+    for reservation in db.tables["credit_reservations"]:
+        if reservation["id"] in (old, committed):
+            reservation["created_at"] = time.time() - 3600
+
+    assert ledger.expire(600) == 1
+    assert balance(db) == 3
+    with pytest.raises(ReservationSettledError):
+        ledger.commit("user", old)
+    assert ledger.commit("user", fresh) == 3
+
+
+def test_cached_balance_follows_writes(db, ledger):
+    assert ledger.balance("user") == 5
+    reservation_id = ledger.reserve("user", 2)
+    assert ledger.balance("user") == 3
+    ledger.refund("user", reservation_id)
+    assert ledger.balance("user") == 5
+    assert ledger.stats()["misses"] == 1
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+pytest.importorskip("openai")
+os.environ.setdefault("OPENAI_API_KEY", "offline-test")
+
+from processor import VideoProcessor
+from profiles import plan_render
+from segmented import SegmentedBurner
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flat_fonts")
+STYLE = {"font_family": "Arial", "font_size": 40, "text_color": "#FFFFFF", "position_y": 50, "has_background": True}
+CAPTIONS = [{"id": "0", "text": "parity", "start_time": 25.0, "end_time": 26.0}]
+
+
+def make_source(path):
+    # Black video with B-frames, so the packet and frame timelines differ.
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", "color=c=black:s=640x360:r=30:d=30",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=30",
+        "-c:v", "libx264", "-preset", "veryfast", "-bf", "2", "-g", "60", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", path
+    ], check=True)
+
+
+def lit_frames(path):
+    # Indices of frames where the caption box raises the average luma.
+    stderr = subprocess.run([
+        "ffmpeg", "-v", "info", "-i", path,
+        "-vf", "signalstats,metadata=mode=print:key=lavfi.signalstats.YAVG",
+        "-f", "null", "-"
+    ], capture_output=True, text=True, check=True).stderr
+    frames = []
+    frame = None
+    for line in stderr.splitlines():
+        m = re.search(r"frame:(\d+)", line)
+        if m:
+            frame = int(m.group(1))
+        m = re.search(r"YAVG=([\d.]+)", line)
+        if m and frame is not None and float(m.group(1)) > 20:
+            frames.append(frame)
+    return frames
+
+
+def test_segmented_burn_matches_single_pass(tmp_path):
+    src = str(tmp_path / "src.mp4")
+    make_source(src)
+    processor = VideoProcessor(FONTS_DIR, str(tmp_path / "cache"))
+    processor.segmented = SegmentedBurner(processor, workers=1)
+
+    single = str(tmp_path / "single.mp4")
+    assert asyncio.run(processor.burn_only(src, single, CAPTIONS, STYLE, quality="720p"))["success"]
+
+    async def segmented_burn(out):
+        info = await processor._probe_media(src)
+        plan = plan_render(info["width"], info["height"], "720p")
+        return await SegmentedBurner(processor, workers=2).burn(src, out, CAPTIONS, STYLE, plan, info)
+
+    segmented = str(tmp_path / "segmented.mp4")
+    assert asyncio.run(segmented_burn(segmented))
+
+    expected = lit_frames(single)
+    assert expected
+    assert lit_frames(segmented) == expected
@@ -0,0 +1,59 @@
+from timing import CaptionTimer, parse_scene_times
+
+
+def caption(text, start, end):
+    return {"id": "0", "text": text, "start_time": start, "end_time": end}
+
+
+def spans(captions):
+    return [(c["text"], c["start_time"], c["end_time"]) for c in captions]
+
+
+def test_short_caption_before_a_pause_is_extended_not_merged():
+    timer = CaptionTimer(min_duration=0.8, max_cps=17, micro_gap=0.3)
+    out = timer.optimise([caption("Hi", 0.0, 0.3), caption("there", 30.0, 31.0)])
+    assert spans(out) == [("Hi", 0.0, 0.8), ("there", 30.0, 31.0)]
+
+
+def test_adjacent_short_captions_are_merged():
+    timer = CaptionTimer(min_duration=0.8, max_cps=17, micro_gap=0.3)
+    out = timer.optimise([caption("Hi", 0.0, 0.15), caption("there", 0.2, 0.4), caption("next", 3.0, 4.0)])
+    assert spans(out) == [("Hi there", 0.0, 0.8), ("next", 3.0, 4.0)]
+    assert [c["id"] for c in out] == ["0", "1"]
+
+
+def test_merge_stops_at_max_chars():
+    timer = CaptionTimer(min_duration=0.8, max_cps=17, micro_gap=0.3, max_chars=8)
+    out = timer.optimise([caption("Hello", 0.0, 0.2), caption("world", 0.25, 0.5)])
+    assert [c["text"] for c in out] == ["Hello", "world"]
+    assert out[0]["end_time"] == 0.25
+
+
+def test_micro_gap_is_closed():
+    timer = CaptionTimer(min_duration=0.5, max_cps=17, micro_gap=0.3)
+    out = timer.optimise([caption("first line", 0.0, 1.0), caption("second line", 1.2, 2.0)])
+    assert out[0]["end_time"] == 1.2
+
+
+def test_boundaries_snap_to_nearby_shot_changes():
+    timer = CaptionTimer(min_duration=0.8, max_cps=17, micro_gap=0.3, snap_window=0.25)
+    out = timer.optimise(
+        [caption("across the cut", 1.1, 2.85), caption("after", 3.5, 4.5)],
+        scenes=[1.0, 3.0]
+    )
+    assert spans(out)[0] == ("across the cut", 1.0, 3.0)
+
+
+def test_snap_never_overlaps_previous_caption():
+    timer = CaptionTimer(min_duration=0.5, max_cps=17, micro_gap=0.0, snap_window=0.25)
+    out = timer.optimise([caption("one", 0.0, 1.1), caption("two", 1.2, 2.2)], scenes=[1.05])
+    assert out[1]["start_time"] >= out[0]["end_time"]
+
+
+def test_parse_scene_times():
+    stderr = (
+        "[Parsed_showinfo_2 @ 0x1] n:   0 pts:  12345 pts_time:4.116   duration: 1\n"
+        "[Parsed_showinfo_2 @ 0x1] n:   1 pts:  22345 pts_time:1.5\n"
+        "frame= 10 pts_time:9\n"
+    )
+    assert parse_scene_times(stderr) == [1.5, 4.116]
@@ -0,0 +1,114 @@
+import os
+import re
+
+from chunking import MAX_CAPTION_CHARS
+
+MIN_DISPLAY_SECONDS = float(os.getenv("CAPTION_MIN_SECONDS", 0.8))
+MAX_CHARS_PER_SECOND = float(os.getenv("CAPTION_MAX_CPS", 17))
+# Gaps shorter than this are closed so consecutive captions abut instead of
+# blinking off for a frame or two.
+MICRO_GAP_SECONDS = float(os.getenv("CAPTION_MICRO_GAP", 0.3))
+SCENE_SNAP_SECONDS = float(os.getenv("CAPTION_SCENE_SNAP", 0.25))
+SCENE_THRESHOLD = float(os.getenv("SCENE_THRESHOLD", 0.3))
+
+SCENE_TIME_RE = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+def parse_scene_times(stderr):
+    times = []
+    for line in stderr.splitlines():
+        if "Parsed_showinfo" not in line:
+            continue
+        m = SCENE_TIME_RE.search(line)
+        if m:
+            times.append(float(m.group(1)))
+    return sorted(set(times))
+
+
+async def detect_scenes(run, path, threshold=SCENE_THRESHOLD):
+    # Scene scores are computed on a small downscale; showinfo logs the
+    # timestamp of every frame that crosses the threshold.
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-i", path, "-an", "-sn",
+        "-vf", f"scale=320:-2,select='gt(scene,{threshold})',showinfo",
+        "-f", "null", "-"
+    ]
+    _, _, stderr = await run(cmd, check=True)
+    return parse_scene_times(stderr)
+
+
+class CaptionTimer:
+    # Post-chunking timing pass, one walk over the (start-ordered) captions
+    # with a forward-only cursor into the shot changes:
+    #   - a caption too short to read is merged into the next one when that
+    #     follows within micro_gap and the text still fits, otherwise
+    #     extended up to the next caption;
+    #   - micro-gaps between captions are closed;
+    #   - start/end boundaries near a shot change are moved onto it, as long
+    #     as the caption keeps its minimum display time.
+    def __init__(self, min_duration=MIN_DISPLAY_SECONDS, max_cps=MAX_CHARS_PER_SECOND, micro_gap=MICRO_GAP_SECONDS, snap_window=SCENE_SNAP_SECONDS, max_chars=MAX_CAPTION_CHARS):
+        self.min_duration = min_duration
+        self.max_cps = max_cps
+        self.micro_gap = micro_gap
+        self.snap_window = snap_window
+        self.max_chars = max_chars
+
+    def _required(self, text):
+        reading = len(text) / self.max_cps if self.max_cps > 0 else 0.0
+        return max(self.min_duration, reading)
+
+    def optimise(self, captions, scenes=(), duration=None):
+        scenes = list(scenes)
+        cursor = 0
+
+        def nearest_scene(t):
+            nonlocal cursor
+            while cursor < len(scenes) and scenes[cursor] < t - self.snap_window:
+                cursor += 1
+            best = None
+            k = cursor
+            while k < len(scenes) and scenes[k] <= t + self.snap_window:
+                if best is None or abs(scenes[k] - t) < abs(best - t):
+                    best = scenes[k]
+                k += 1
+            return best
+
+        out = []
+        i = 0
+        n = len(captions)
+        while i < n:
+            c = captions[i]
+            text = str(c['text'])
+            start = float(c['start_time'])
+            end = max(float(c['end_time']), start)
+            i += 1
+
+            # Only captions that follow without a real pause are merged; a
+            # short caption before a pause is extended instead.
+            while i < n and end - start < self._required(text) and float(captions[i]['start_time']) - end <= self.micro_gap:
+                merged = f"{text} {captions[i]['text']}"
+                if len(merged) > self.max_chars:
+                    break
+                text = merged
+                end = max(end, float(captions[i]['end_time']))
+                i += 1
+
+            prev_end = out[-1]["end_time"] if out else 0.0
+            next_start = float(captions[i]['start_time']) if i < n else (duration if duration else float("inf"))
+            required = self._required(text)
+            end = min(end, max(start, next_start))
+
+            scene = nearest_scene(start) if scenes else None
+            if scene is not None and scene >= prev_end and end - scene >= min(required, end - start):
+                start = scene
+
+            end = max(end, min(start + required, next_start))
+            if 0 < next_start - end < self.micro_gap:
+                end = next_start
+
+            scene = nearest_scene(end) if scenes else None
+            if scene is not None and scene <= next_start and scene - start >= min(required, end - start):
+                end = scene
+
+            out.append({"id": str(len(out)), "text": text, "start_time": round(start, 3), "end_time": round(end, 3)})
+        return out
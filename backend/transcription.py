@@ -0,0 +1,190 @@
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+
+MAX_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", 600))
+# Whisper's upload cap is 25 MB; stay comfortably under it.
+MAX_CHUNK_BYTES = int(os.getenv("TRANSCRIBE_CHUNK_BYTES", 20 * 1024 * 1024))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", 4))
+SILENCE_NOISE = os.getenv("SILENCE_NOISE", "-35dB")
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", 0.4))
+
+SILENCE_START_RE = re.compile(r"silence_start: (-?[\d.]+)")
+SILENCE_END_RE = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+def transcript_to_dict(transcript):
+    return {
+        "language": getattr(transcript, 'language', None),
+        "duration": getattr(transcript, 'duration', None),
+        "segments": [
+            {
+                "id": getattr(seg, 'id', i),
+                "start": getattr(seg, 'start', 0.0),
+                "end": getattr(seg, 'end', 0.0),
+                "text": getattr(seg, 'text', '')
+            }
+            for i, seg in enumerate(getattr(transcript, 'segments', None) or [])
+        ],
+        "words": [
+            {
+                "word": getattr(w, 'word', ''),
+                "start": getattr(w, 'start', 0.0),
+                "end": getattr(w, 'end', 0.0)
+            }
+            for w in (getattr(transcript, 'words', None) or [])
+        ]
+    }
+
+
+class OpenAIWhisperBackend:
+    # Any backend exposes `model` and `async transcribe(source) -> transcript
+    # dict`, where source is a file path or an in-memory (filename, bytes).
+    def __init__(self, client, model="whisper-1"):
+        self.client = client
+        self.model = model
+
+    async def _create(self, file):
+        return await self.client.audio.transcriptions.create(
+            model=self.model,
+            file=file,
+            response_format="verbose_json",
+            timestamp_granularities=["segment", "word"]
+        )
+
+    async def transcribe(self, source):
+        if isinstance(source, tuple):
+            return transcript_to_dict(await self._create(source))
+        with open(source, "rb") as f:
+            return transcript_to_dict(await self._create(f))
+
+
+def parse_silences(stderr):
+    silences = []
+    start = None
+    for line in stderr.splitlines():
+        m = SILENCE_START_RE.search(line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            continue
+        m = SILENCE_END_RE.search(line)
+        if m and start is not None:
+            silences.append((start, float(m.group(1))))
+            start = None
+    return silences
+
+
+def plan_chunks(duration, silences, max_seconds):
+    # Cut in the middle of the last silence before each chunk hits
+    # max_seconds; with no usable silence, cut hard at the limit.
+    if duration <= max_seconds:
+        return [(0.0, duration)]
+
+    midpoints = [(s + e) / 2 for s, e in silences]
+    chunks = []
+    start = 0.0
+    i = 0
+    while duration - start > max_seconds:
+        limit = start + max_seconds
+        cut = None
+        while i < len(midpoints) and midpoints[i] <= limit:
+            if midpoints[i] > start + max_seconds / 2:
+                cut = midpoints[i]
+            i += 1
+        if cut is None:
+            cut = limit
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, duration))
+    return chunks
+
+
+def stitch(parts):
+    # parts: [(offset, transcript)] in time order.
+    merged = {"language": None, "duration": 0.0, "segments": [], "words": []}
+    for offset, transcript in parts:
+        merged["language"] = merged["language"] or transcript.get("language")
+        for seg in transcript["segments"]:
+            merged["segments"].append({
+                **seg,
+                "id": len(merged["segments"]),
+                "start": float(seg["start"]) + offset,
+                "end": float(seg["end"]) + offset
+            })
+        for w in transcript["words"]:
+            merged["words"].append({
+                **w,
+                "start": float(w["start"]) + offset,
+                "end": float(w["end"]) + offset
+            })
+        if transcript.get("duration"):
+            merged["duration"] = max(merged["duration"], offset + float(transcript["duration"]))
+    return merged
+
+
+class TranscriptionPipeline:
+    # silencedetect -> split at silences into size-bounded chunks ->
+    # transcribe chunks concurrently -> stitch with offsets and contiguous ids.
+    def __init__(self, backend, run, max_chunk_seconds=MAX_CHUNK_SECONDS, max_chunk_bytes=MAX_CHUNK_BYTES, concurrency=TRANSCRIBE_CONCURRENCY):
+        self.backend = backend
+        self.run = run
+        self.max_chunk_seconds = max_chunk_seconds
+        self.max_chunk_bytes = max_chunk_bytes
+        self.concurrency = concurrency
+
+    @property
+    def model(self):
+        return self.backend.model
+
+    async def detect_silences(self, audio_p):
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", audio_p,
+            "-af", f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_SECONDS}",
+            "-f", "null", "-"
+        ]
+        _, _, stderr = await self.run(cmd, check=True)
+        return parse_silences(stderr)
+
+    async def split(self, audio_p, chunks, work_dir):
+        ext = os.path.splitext(audio_p)[1]
+        paths = []
+        for n, (start, end) in enumerate(chunks):
+            out_p = os.path.join(work_dir, f"chunk_{n:04d}{ext}")
+            await self.run([
+                "ffmpeg", "-y", "-v", "error",
+                "-ss", f"{start:.3f}", "-to", f"{end:.3f}", "-i", audio_p,
+                "-c", "copy", out_p
+            ], check=True)
+            paths.append(out_p)
+        return paths
+
+    async def transcribe(self, audio, duration):
+        # audio: an ExtractedAudio; only long audio is materialised to disk.
+        max_seconds = self.max_chunk_seconds
+        if audio.size > self.max_chunk_bytes and duration > 0:
+            max_seconds = min(max_seconds, duration * self.max_chunk_bytes / audio.size)
+
+        if duration <= max_seconds:
+            return await self.backend.transcribe(audio.as_upload())
+
+        audio_p = audio.path
+        silences = await self.detect_silences(audio_p)
+        chunks = plan_chunks(duration, silences, max_seconds)
+        print(f"🎙️ Transcribing {len(chunks)} chunks ({duration:.0f}s of audio)")
+
+        work_dir = tempfile.mkdtemp(prefix="transcribe_")
+        try:
+            paths = await self.split(audio_p, chunks, work_dir)
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def run(path):
+                async with semaphore:
+                    return await self.backend.transcribe(path)
+
+            results = await asyncio.gather(*(run(p) for p in paths))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return stitch([(start, result) for (start, _), result in zip(chunks, results)])
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+# Rough chars-per-token ratio; good enough to keep batches under budget.
+CHARS_PER_TOKEN = 4
+SEGMENT_OVERHEAD_TOKENS = 8
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + SEGMENT_OVERHEAD_TOKENS
+
+
+class BatchTranslator:
+    def __init__(self, client, model="gpt-4o", max_batch_tokens=1500, max_concurrency=4, max_retries=2):
+        self.client = client
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+    def _system_prompt(self, target_language):
+        return (
+            f"You are a professional subtitle translator specializing in {target_language}. "
+            f"Translate each English subtitle segment to {target_language}. "
+            "For regional Indian languages (Hindi, Tamil, Telugu, Bengali, Marathi, Punjabi, Gujarati, Kannada, Malayalam, Odia, Urdu), "
+            "use natural, conversational language that matches the speaking style. "
+            "Keep translations concise and subtitle-friendly (max 2 lines). "
+            "Preserve the emotional tone and cultural context. "
+            "The input is a JSON object mapping segment ids to text. "
+            "Return ONLY a JSON object with exactly the same ids mapped to the translated text."
+        )
+
+    def pack(self, segments):
+        batches = []
+        current = {}
+        used = 0
+        for seg_id, text in segments.items():
+            cost = estimate_tokens(text)
+            if current and used + cost > self.max_batch_tokens:
+                batches.append(current)
+                current = {}
+                used = 0
+            current[seg_id] = text
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _translate_batch(self, batch, target_language):
+        res = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self._system_prompt(target_language)},
+                {"role": "user", "content": json.dumps(batch, ensure_ascii=False)}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.3
+        )
+        content = res.choices[0].message.content or ""
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        translated = {}
+        for seg_id in batch:
+            value = data.get(seg_id)
+            if isinstance(value, str) and value.strip():
+                translated[seg_id] = value.strip().strip('"').strip("'")
+        return translated
+
+    async def translate(self, segments, target_language, fallback=True):
+        # segments: {segment_id: text}. Ids are stringified so they survive the JSON round trip.
+        pending = {str(k): v for k, v in segments.items() if v}
+        results = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                try:
+                    return await self._translate_batch(batch, target_language)
+                except Exception as e:
+                    print(f"GPT Translation Error: {e}")
+                    return {}
+
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                print(f"🔁 Retrying {len(pending)} untranslated segments (attempt {attempt})")
+            batches = self.pack(pending)
+            for translated in await asyncio.gather(*(run(b) for b in batches)):
+                results.update(translated)
+            pending = {k: v for k, v in pending.items() if k not in results}
+
+        # Anything still missing falls back to the source text, as the per-segment path did.
+        if fallback:
+            for seg_id, text in pending.items():
+                results[seg_id] = text
+        return results
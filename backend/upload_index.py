@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+
+from cache import atomic_write
+
+# Last-access times are kept in memory on every touch and written back by the
+# storage sweep at most this often, so reads never rewrite the index.
+ACCESS_SAVE_SECONDS = 60
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+class UploadIndex:
+    # file_id -> {file_name, path, size, content_hash, created_at, probes}.
+    # Kept in memory and rewritten to index_path on change; that must be
+    # outside the served upload dir since it lists every upload.
+    # Probe results are stored per record and invalidated if the file's
+    # size or mtime no longer match.
+    def __init__(self, upload_dir, index_path):
+        self.upload_dir = upload_dir
+        self.path = index_path
+        legacy = os.path.join(upload_dir, ".index.json")
+        if os.path.exists(legacy):
+            if os.path.exists(self.path):
+                os.remove(legacy)
+            else:
+                os.replace(legacy, self.path)
+        self.records = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._save_lock = threading.Lock()
+        self._by_hash = {}
+        self._by_path = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            self._bootstrap()
+        for file_id, record in self.records.items():
+            self._link(file_id, record)
+
+    def _bootstrap(self):
+        # First start with an index: adopt files uploaded before it existed,
+        # plus the content hashes recorded by the old .hashes.json map.
+        legacy_hashes = {}
+        try:
+            with open(os.path.join(self.upload_dir, ".hashes.json"), "r", encoding="utf-8") as f:
+                legacy_hashes = {name: h for h, name in json.load(f).items()}
+        except (OSError, ValueError):
+            pass
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            self.records[os.path.splitext(name)[0]] = self._new_record(name, legacy_hashes.get(name))
+        self._save()
+
+    def _new_record(self, file_name, content_hash, original_filename=None):
+        path = os.path.join(self.upload_dir, file_name)
+        return {
+            "file_name": file_name,
+            "path": path,
+            "size": os.path.getsize(path),
+            "content_hash": content_hash,
+            "original_filename": original_filename,
+            "created_at": time.time(),
+            "probes": {}
+        }
+
+    def _link(self, file_id, record):
+        if record.get("content_hash"):
+            self._by_hash[record["content_hash"]] = file_id
+        self._by_path[os.path.abspath(record["path"])] = file_id
+
+    def _save(self):
+        # Also called from the storage sweep's thread; the snapshot and write
+        # happen under one lock so an older snapshot can't land last.
+        with self._save_lock:
+            self._dirty = False
+            self._saved_at = time.time()
+            atomic_write(self.path, json.dumps(self.records, ensure_ascii=False))
+
+    def flush(self, force=False):
+        if self._dirty and (force or time.time() - self._saved_at >= ACCESS_SAVE_SECONDS):
+            self._save()
+
+    def add(self, file_id, file_name, content_hash, original_filename=None):
+        record = self._new_record(file_name, content_hash, original_filename)
+        self.records[file_id] = record
+        self._link(file_id, record)
+        self._save()
+        return record
+
+    def remove(self, file_id):
+        record = self.records.pop(file_id, None)
+        if not record:
+            return
+        if self._by_hash.get(record.get("content_hash")) == file_id:
+            del self._by_hash[record["content_hash"]]
+        self._by_path.pop(os.path.abspath(record["path"]), None)
+        self._save()
+
+    def get(self, file_id):
+        return self.records.get(file_id)
+
+    def touch(self, file_id):
+        record = self.records.get(file_id)
+        if not record:
+            return
+        record["accessed_at"] = time.time()
+        self._dirty = True
+
+    def last_access(self, file_id):
+        record = self.records[file_id]
+        return record.get("accessed_at") or record["created_at"]
+
+    def path_for(self, file_id):
+        record = self.records.get(file_id)
+        if record and os.path.exists(record["path"]):
+            return record["path"]
+        return None
+
+    def find_by_hash(self, content_hash):
+        file_id = self._by_hash.get(content_hash)
+        if file_id and self.path_for(file_id):
+            return file_id
+        return None
+
+    def get_probe(self, path, kind):
+        record = self.records.get(self._by_path.get(os.path.abspath(path)))
+        if not record:
+            return None
+        entry = record["probes"].get(kind)
+        try:
+            if entry and entry["stat"] == _stat_key(path):
+                return entry["value"]
+        except OSError:
+            pass
+        return None
+
+    def set_probe(self, path, kind, value):
+        record = self.records.get(self._by_path.get(os.path.abspath(path)))
+        if not record:
+            return
+        record["probes"][kind] = {"stat": _stat_key(path), "value": value}
+        self._save()
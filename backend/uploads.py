@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+import aiofiles
+
+from cache import atomic_write
+
+SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", 24 * 3600))
+HASH_READ_SIZE = 1024 * 1024
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400, received=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.received = received
+
+
+def parse_content_range(header):
+    m = CONTENT_RANGE_RE.fullmatch((header or "").strip())
+    if not m:
+        raise UploadError("Missing or invalid Content-Range header")
+    start, end = int(m.group(1)), int(m.group(2))
+    if end < start:
+        raise UploadError("Invalid Content-Range header")
+    return start, end
+
+
+class UploadManager:
+    # Chunks are appended to <partial_dir>/<file_id>.<ext> and hashed as they
+    # arrive; finalize renames the file into place, so every byte is written
+    # exactly once. partial_dir must not be publicly served, and should be on
+    # the same filesystem as upload_dir.
+    def __init__(self, upload_dir, index, partial_dir):
+        self.upload_dir = upload_dir
+        self.index = index
+        self.partial_dir = partial_dir
+        os.makedirs(self.partial_dir, exist_ok=True)
+        # Sessions used to live under the (served) upload dir.
+        shutil.rmtree(os.path.join(upload_dir, ".partial"), ignore_errors=True)
+        self._hashers = {}
+        self._writing = set()
+
+    def _session_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.json")
+
+    def _load_session(self, upload_id):
+        try:
+            with open(self._session_path(upload_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Upload session not found", status_code=404)
+
+    def _save_session(self, session):
+        atomic_write(self._session_path(session["upload_id"]), json.dumps(session))
+
+    def _discard_session(self, session):
+        self._hashers.pop(session["upload_id"], None)
+        for path in (session["partial_path"], self._session_path(session["upload_id"])):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def create(self, filename, size):
+        self._purge_expired()
+        upload_id = str(uuid.uuid4())
+        file_id = str(uuid.uuid4())
+        file_ext = filename.split('.')[-1]
+        session = {
+            "upload_id": upload_id,
+            "file_id": file_id,
+            "file_ext": file_ext,
+            "original_filename": filename,
+            "size": size,
+            "received": 0,
+            "partial_path": os.path.join(self.partial_dir, f"{file_id}.{file_ext}"),
+            "created_at": time.time()
+        }
+        open(session["partial_path"], "wb").close()
+        self._save_session(session)
+        self._hashers[upload_id] = hashlib.sha256()
+        return session
+
+    def status(self, upload_id):
+        return self._load_session(upload_id)
+
+    def _rehash(self, session):
+        hasher = hashlib.sha256()
+        with open(session["partial_path"], "r+b") as f:
+            f.truncate(session["received"])
+            for chunk in iter(lambda: f.read(HASH_READ_SIZE), b""):
+                hasher.update(chunk)
+        return hasher
+
+    async def _hasher_for(self, session):
+        hasher = self._hashers.get(session["upload_id"])
+        if hasher is not None:
+            return hasher
+        # Process restarted mid-upload: drop any unacknowledged tail and
+        # rebuild the hash state from the bytes already on disk, off the
+        # event loop since that can be the whole file.
+        hasher = await asyncio.to_thread(self._rehash, session)
+        self._hashers[session["upload_id"]] = hasher
+        return hasher
+
+    async def write_chunk(self, upload_id, start, end, stream):
+        session = self._load_session(upload_id)
+        if start != session["received"]:
+            raise UploadError("Chunk does not start at the current offset", status_code=409, received=session["received"])
+        if end >= session["size"]:
+            raise UploadError("Chunk extends past the declared upload size", status_code=416, received=session["received"])
+
+        if upload_id in self._writing:
+            raise UploadError("Another chunk for this upload is in progress", status_code=409, received=session["received"])
+
+        self._writing.add(upload_id)
+        expected = end - start + 1
+        written = 0
+        try:
+            hasher = await self._hasher_for(session)
+            async with aiofiles.open(session["partial_path"], "r+b") as f:
+                # Drops anything a failed earlier write (e.g. ENOSPC) left
+                # past the acknowledged bytes, so the file matches the hash.
+                await f.seek(session["received"])
+                await f.truncate()
+                async for chunk in stream:
+                    if written + len(chunk) > expected:
+                        raise UploadError("Chunk body is larger than its Content-Range", received=session["received"])
+                    await f.write(chunk)
+                    hasher.update(chunk)
+                    written += len(chunk)
+        finally:
+            session["received"] += written
+            self._save_session(session)
+            self._writing.discard(upload_id)
+
+        if written != expected:
+            # Connection dropped mid-chunk: the bytes we did get are kept and
+            # the client resumes from session["received"].
+            raise UploadError("Chunk body is shorter than its Content-Range", received=session["received"])
+        return session
+
+    async def finalize(self, upload_id):
+        session = self._load_session(upload_id)
+        if session["received"] != session["size"]:
+            raise UploadError("Upload is incomplete", status_code=409, received=session["received"])
+
+        content_hash = (await self._hasher_for(session)).hexdigest()
+        existing = self.index.find_by_hash(content_hash)
+        if existing:
+            self._discard_session(session)
+            return {"file_id": existing, "record": self.index.get(existing), "deduplicated": True}
+
+        file_name = f"{session['file_id']}.{session['file_ext']}"
+        os.replace(session["partial_path"], os.path.join(self.upload_dir, file_name))
+        self._discard_session(session)
+        record = self.index.add(session["file_id"], file_name, content_hash, session["original_filename"])
+        return {"file_id": session["file_id"], "record": record, "deduplicated": False}
+
+    def _purge_expired(self):
+        cutoff = time.time() - SESSION_TTL_SECONDS
+        for name in os.listdir(self.partial_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                session = self._load_session(name[:-5])
+            except UploadError:
+                continue
+            if session["created_at"] < cutoff:
+                self._discard_session(session)
@@ -109,11 +109,35 @@ export default function ExportPanel({ open, onClose, captions, videoUrl, caption
         })
       });
 
-      setExportProgress(80);
-      const data = await exportRes.json();
+      const queued = await exportRes.json();
 
       if (!exportRes.ok) {
-        throw new Error(data.detail || 'Export failed');
+        throw new Error(queued.detail || 'Export failed');
+      }
+      if (!queued.success || !(queued.job_id || queued.video_url)) {
+        throw new Error(queued.error || 'Export failed');
+      }
+
+      // An identical earlier export is returned straight away, without a job.
+      let data = queued.video_url ? queued : null;
+      if (!data) {
+        setExportProgress(30);
+        let job = null;
+        while (true) {
+          await new Promise(resolve => setTimeout(resolve, 2000));
+          const jobRes = await fetch(`${backendUrl}/api/jobs/${queued.job_id}`);
+          job = await jobRes.json();
+          if (!jobRes.ok) {
+            throw new Error(job.detail || 'Export failed');
+          }
+          if (job.status === 'completed' || job.status === 'failed') break;
+          if (job.progress && typeof job.progress.percent === 'number') {
+            setExportProgress(30 + Math.round(job.progress.percent * 0.65));
+          } else {
+            setExportProgress(prev => Math.min(prev + 5, 90));
+          }
+        }
+        data = job.result || { success: false, error: job.error };
       }
 
       if (data.success && data.video_url) {
@@ -177,6 +201,15 @@ export default function ExportPanel({ open, onClose, captions, videoUrl, caption
       loading: exportingVideo === '720p',
       requiresBackend: true
     },
+    {
+      icon: Video,
+      title: 'Quick Draft (360p)',
+      description: 'Fast low-res render to check caption placement',
+      action: () => handleExportVideo('draft'),
+      gradient: 'from-slate-500 to-gray-500',
+      loading: exportingVideo === 'draft',
+      requiresBackend: true
+    },
     {
       icon: Download,
       title: 'Download Original Video',
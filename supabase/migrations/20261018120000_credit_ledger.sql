@@ -0,0 +1,142 @@
+/*
+  # Atomic credit ledger
+
+  1. New Tables
+    - `credit_reservations`
+      - `id` (uuid, primary key)
+      - `user_id` (uuid, references user_profiles)
+      - `amount` (integer) - Credits held for the export
+      - `status` (text) - 'reserved', 'committed', 'refunded'
+      - `created_at` (timestamptz)
+      - `settled_at` (timestamptz)
+
+  2. Functions
+    - `reserve_credits(p_user_id, p_amount)` - takes credits off the balance
+      only if enough remain, in one conditional UPDATE, and records a
+      reservation
+    - `commit_credits(p_reservation_id)` - marks a reservation as spent
+    - `refund_credits(p_reservation_id)` - returns a reservation's credits;
+      a reservation can only be settled once
+    - `add_credits(p_user_id, p_amount)` - adds purchased credits to both
+      the balance and the lifetime total in one statement
+    All return jsonb with the resulting `credits_remaining`.
+
+  3. Security
+    - Enable RLS on credit_reservations (no user policies; backend only)
+    - Functions run as SECURITY DEFINER and are executable by service_role only
+*/
+
+CREATE TABLE IF NOT EXISTS credit_reservations (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id uuid NOT NULL REFERENCES user_profiles(id) ON DELETE CASCADE,
+  amount integer NOT NULL,
+  status text NOT NULL DEFAULT 'reserved',
+  created_at timestamptz DEFAULT now(),
+  settled_at timestamptz,
+  CONSTRAINT amount_check CHECK (amount > 0),
+  CONSTRAINT reservation_status_check CHECK (status IN ('reserved', 'committed', 'refunded'))
+);
+
+ALTER TABLE credit_reservations ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_credit_reservations_user_id ON credit_reservations(user_id);
+CREATE INDEX IF NOT EXISTS idx_credit_reservations_open ON credit_reservations(created_at) WHERE status = 'reserved';
+
+CREATE OR REPLACE FUNCTION reserve_credits(p_user_id uuid, p_amount integer)
+RETURNS jsonb AS $$
+DECLARE
+  v_balance integer;
+  v_reservation uuid;
+BEGIN
+  UPDATE user_profiles
+    SET credits_remaining = credits_remaining - p_amount
+    WHERE id = p_user_id AND credits_remaining >= p_amount
+    RETURNING credits_remaining INTO v_balance;
+
+  IF NOT FOUND THEN
+    SELECT credits_remaining INTO v_balance FROM user_profiles WHERE id = p_user_id;
+    RETURN jsonb_build_object('reservation_id', NULL, 'credits_remaining', COALESCE(v_balance, 0));
+  END IF;
+
+  INSERT INTO credit_reservations (user_id, amount)
+    VALUES (p_user_id, p_amount)
+    RETURNING id INTO v_reservation;
+
+  RETURN jsonb_build_object('reservation_id', v_reservation, 'credits_remaining', v_balance);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION commit_credits(p_reservation_id uuid)
+RETURNS jsonb AS $$
+DECLARE
+  v_user uuid;
+  v_balance integer;
+  v_committed boolean;
+BEGIN
+  UPDATE credit_reservations
+    SET status = 'committed', settled_at = now()
+    WHERE id = p_reservation_id AND status = 'reserved'
+    RETURNING user_id INTO v_user;
+  v_committed := FOUND;
+
+  IF NOT v_committed THEN
+    SELECT user_id INTO v_user FROM credit_reservations WHERE id = p_reservation_id;
+  END IF;
+
+  SELECT credits_remaining INTO v_balance FROM user_profiles WHERE id = v_user;
+  RETURN jsonb_build_object('committed', v_committed, 'credits_remaining', v_balance);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION refund_credits(p_reservation_id uuid)
+RETURNS jsonb AS $$
+DECLARE
+  v_user uuid;
+  v_amount integer;
+  v_balance integer;
+BEGIN
+  UPDATE credit_reservations
+    SET status = 'refunded', settled_at = now()
+    WHERE id = p_reservation_id AND status = 'reserved'
+    RETURNING user_id, amount INTO v_user, v_amount;
+
+  IF NOT FOUND THEN
+    SELECT p.credits_remaining INTO v_balance
+      FROM credit_reservations r JOIN user_profiles p ON p.id = r.user_id
+      WHERE r.id = p_reservation_id;
+    RETURN jsonb_build_object('refunded', false, 'credits_remaining', v_balance);
+  END IF;
+
+  UPDATE user_profiles
+    SET credits_remaining = credits_remaining + v_amount
+    WHERE id = v_user
+    RETURNING credits_remaining INTO v_balance;
+
+  RETURN jsonb_build_object('refunded', true, 'credits_remaining', v_balance);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION add_credits(p_user_id uuid, p_amount integer)
+RETURNS jsonb AS $$
+DECLARE
+  v_balance integer;
+BEGIN
+  UPDATE user_profiles
+    SET credits_remaining = credits_remaining + p_amount,
+        total_credits_purchased = total_credits_purchased + p_amount
+    WHERE id = p_user_id
+    RETURNING credits_remaining INTO v_balance;
+
+  RETURN jsonb_build_object('credits_remaining', v_balance);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION reserve_credits(uuid, integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION commit_credits(uuid) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION refund_credits(uuid) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION add_credits(uuid, integer) FROM PUBLIC, anon, authenticated;
+
+GRANT EXECUTE ON FUNCTION reserve_credits(uuid, integer) TO service_role;
+GRANT EXECUTE ON FUNCTION commit_credits(uuid) TO service_role;
+GRANT EXECUTE ON FUNCTION refund_credits(uuid) TO service_role;
+GRANT EXECUTE ON FUNCTION add_credits(uuid, integer) TO service_role;
@@ -0,0 +1,111 @@
+/*
+  # Settle abandoned credit reservations
+
+  A reservation left in 'reserved' (worker crash or restart, or a reserve
+  call whose response never reached the backend) used to hold the user's
+  credits forever.
+
+  1. Functions
+    - `reserve_credits(p_user_id, p_amount, p_reservation_id)` - now takes
+      the reservation id from the caller, so a timed-out call can be retried
+      without reserving twice: a repeat with the same id returns the
+      existing reservation instead of taking credits again
+    - `cancel_reservation(p_reservation_id, p_user_id, p_amount)` - refunds
+      the reservation if it exists; if the reserve never ran yet, records it
+      as already refunded so a late reserve with that id takes nothing
+    - `expire_reservations(p_max_age_seconds)` - refunds every reservation
+      still open after the given age and returns how many were expired
+
+  2. Security
+    - Executable by service_role only, like the other credit functions
+*/
+
+DROP FUNCTION IF EXISTS reserve_credits(uuid, integer);
+
+CREATE OR REPLACE FUNCTION reserve_credits(p_user_id uuid, p_amount integer, p_reservation_id uuid DEFAULT NULL)
+RETURNS jsonb AS $$
+DECLARE
+  v_balance integer;
+  v_reservation uuid := COALESCE(p_reservation_id, gen_random_uuid());
+  v_status text;
+BEGIN
+  -- Claim the id first; a concurrent call with the same id waits here.
+  INSERT INTO credit_reservations (id, user_id, amount)
+    VALUES (v_reservation, p_user_id, p_amount)
+    ON CONFLICT (id) DO NOTHING;
+
+  IF NOT FOUND THEN
+    SELECT r.status, p.credits_remaining INTO v_status, v_balance
+      FROM credit_reservations r JOIN user_profiles p ON p.id = r.user_id
+      WHERE r.id = v_reservation;
+    RETURN jsonb_build_object(
+      'reservation_id', CASE WHEN v_status = 'refunded' THEN NULL ELSE v_reservation END,
+      'credits_remaining', COALESCE(v_balance, 0)
+    );
+  END IF;
+
+  UPDATE user_profiles
+    SET credits_remaining = credits_remaining - p_amount
+    WHERE id = p_user_id AND credits_remaining >= p_amount
+    RETURNING credits_remaining INTO v_balance;
+
+  IF NOT FOUND THEN
+    DELETE FROM credit_reservations WHERE id = v_reservation;
+    SELECT credits_remaining INTO v_balance FROM user_profiles WHERE id = p_user_id;
+    RETURN jsonb_build_object('reservation_id', NULL, 'credits_remaining', COALESCE(v_balance, 0));
+  END IF;
+
+  RETURN jsonb_build_object('reservation_id', v_reservation, 'credits_remaining', v_balance);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION cancel_reservation(p_reservation_id uuid, p_user_id uuid, p_amount integer)
+RETURNS jsonb AS $$
+DECLARE
+  v_balance integer;
+BEGIN
+  INSERT INTO credit_reservations (id, user_id, amount, status, settled_at)
+    VALUES (p_reservation_id, p_user_id, p_amount, 'refunded', now())
+    ON CONFLICT (id) DO NOTHING;
+
+  IF FOUND THEN
+    SELECT credits_remaining INTO v_balance FROM user_profiles WHERE id = p_user_id;
+    RETURN jsonb_build_object('refunded', false, 'credits_remaining', v_balance);
+  END IF;
+
+  RETURN refund_credits(p_reservation_id);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION expire_reservations(p_max_age_seconds integer)
+RETURNS jsonb AS $$
+DECLARE
+  v_count integer;
+BEGIN
+  WITH expired AS (
+    UPDATE credit_reservations
+      SET status = 'refunded', settled_at = now()
+      WHERE status = 'reserved' AND created_at < now() - make_interval(secs => p_max_age_seconds)
+      RETURNING user_id, amount
+  ), totals AS (
+    SELECT user_id, sum(amount) AS amount FROM expired GROUP BY user_id
+  ), refunded AS (
+    UPDATE user_profiles p
+      SET credits_remaining = p.credits_remaining + t.amount
+      FROM totals t
+      WHERE p.id = t.user_id
+      RETURNING p.id
+  )
+  SELECT count(*) INTO v_count FROM expired;
+
+  RETURN jsonb_build_object('expired', v_count);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION reserve_credits(uuid, integer, uuid) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION cancel_reservation(uuid, uuid, integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION expire_reservations(integer) FROM PUBLIC, anon, authenticated;
+
+GRANT EXECUTE ON FUNCTION reserve_credits(uuid, integer, uuid) TO service_role;
+GRANT EXECUTE ON FUNCTION cancel_reservation(uuid, uuid, integer) TO service_role;
+GRANT EXECUTE ON FUNCTION expire_reservations(integer) TO service_role;